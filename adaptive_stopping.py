@@ -0,0 +1,67 @@
+# adaptive number of simulations per date: batches are streamed into an
+# aggregate until the confidence interval on P(Trump win) is narrower than
+# the target, so lopsided dates stop after a few thousand simulations and
+# close ones run longer; optionally the top-k maps also have to be told
+# apart from the rest (their counts are often too thin to settle quickly)
+
+import math
+import numpy as np
+from batch_engine import simulation_chunks, chunk_rng, simulate_batch
+from correlated_engine import simulate_correlated_batch
+from model_snapshot import snapshot_probabilities
+from streaming import MEMORY_BUDGET_MB, budget_sizes, new_aggregate, update_aggregate
+
+TARGET_WIDTH = 0.01
+CONFIDENCE_Z = 1.96
+# 0: P(Trump win) precision only
+TOP_K = 0
+BATCH_SIZE = 5000
+MAX_SIMULATIONS = 1_000_000
+
+
+def win_probability_interval(wins, number_of_simulations, z=CONFIDENCE_Z):
+    # Wilson score interval, sensible even when no simulation (or every one) is a win
+    if number_of_simulations == 0:
+        return 0.0, 1.0
+    p = wins / number_of_simulations
+    denominator = 1 + z * z / number_of_simulations
+    center = (p + z * z / (2 * number_of_simulations)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / number_of_simulations + z * z / (4 * number_of_simulations ** 2)) / denominator
+    return center - half_width, center + half_width
+
+
+def top_k_separated(aggregate, top_k, z=CONFIDENCE_Z):
+    # the set of the k most frequent maps is settled, whatever the order inside
+    # it: the k-th count exceeds the (k+1)-th by more than z standard deviations
+    # of their difference (about n_k + n_k+1 for two multinomial counts)
+    if top_k == 0:
+        return True
+    counts = np.concatenate([np.sort(aggregate['sketch_counts'])[::-1], np.zeros(top_k + 1, dtype=np.int64)])
+    kth, next_count = int(counts[top_k - 1]), int(counts[top_k])
+    return kth - next_count > z * math.sqrt(kth + next_count)
+
+
+def simulate_adaptive(snapshot, date_object, engine, seed, target_width=TARGET_WIDTH, top_k=TOP_K,
+                      max_simulations=MAX_SIMULATIONS, batch_size=BATCH_SIZE, memory_budget_mb=MEMORY_BUDGET_MB, sampler="iid"):
+    # the streaming aggregate of the simulations used, with 'stopped_by' set to
+    # "precision" or "max_simulations"; batch i is drawn from chunk_rng(seed, date, i)
+    # so a rerun with the same seed stops at the same point
+    _, sketch_capacity = budget_sizes(memory_budget_mb)
+    aggregate = new_aggregate(snapshot, sketch_capacity)
+    trump_probs = snapshot_probabilities(snapshot)
+    aggregate['stopped_by'] = "max_simulations"
+    for chunk_index, start, stop in simulation_chunks(max_simulations, batch_size):
+        rng = chunk_rng(seed, date_object, chunk_index)
+        if engine == "numpy":
+            update_aggregate(aggregate, *simulate_batch(trump_probs, stop - start, rng, sampler=sampler, analytics=aggregate['analytics']))
+        elif engine == "correlated":
+            update_aggregate(aggregate, *simulate_correlated_batch(snapshot, stop - start, rng, sampler=sampler, analytics=aggregate['analytics']))
+        else:
+            raise ValueError(f"adaptive stopping needs a batch engine, got {engine}")
+
+        low, high = win_probability_interval(aggregate['counts'][0], aggregate['number_of_simulations'])
+        if high - low <= target_width and top_k_separated(aggregate, top_k):
+            aggregate['stopped_by'] = "precision"
+            break
+    aggregate['interval'] = win_probability_interval(aggregate['counts'][0], aggregate['number_of_simulations'])
+    return aggregate
@@ -0,0 +1,90 @@
+# sorted columnar as-of poll store: the polls of every (state, candidate)
+# group sit contiguous in numpy arrays, oldest first, with an offset table,
+# so "the latest N polls of S and C as of D" is a searchsorted and a slice,
+# and the whole (dates x states x candidates) grid is a single vectorized call
+#
+#   asof = build_asof_polls(df)
+#   asof_poll_windows(asof, dates)['means']   (dates, states, candidates) poll means
+#   latest_polls(asof, "Ohio", "Trump", date(2024, 10, 1))
+
+import numpy as np
+import pandas as pd
+from electoral_numbers import ELECTORAL_NUMBERS
+from poll_index import CANDIDATE_ALIASES, POLL_WINDOW
+
+STATES = [state_info['state'] for state_info in ELECTORAL_NUMBERS]
+CANDIDATES = list(CANDIDATE_ALIASES)
+GROUPS = len(STATES) * len(CANDIDATES)
+# a key is group * DAY_SPAN + days since the epoch, sorted keys are sorted by group then day
+DAY_SPAN = 1 << 32
+ASOF_ARRAYS = ('keys', 'days', 'pct', 'offsets')
+
+
+def group_of(state, candidate):
+    return STATES.index(state) * len(CANDIDATES) + CANDIDATES.index(candidate)
+
+
+def as_days(dates):
+    # dates / datetimes / datetime64 to int64 days since the epoch
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def build_asof_polls(df):
+    # df with state, answer, pct and end_date parsed as datetime; polls of the
+    # same day keep the newest-first order of build_poll_index (the csv order)
+    # once a window is read newest first, so the means are the same
+    answer_candidate = {answer: candidate for candidate, answers in CANDIDATE_ALIASES.items() for answer in answers}
+    df = df[df['state'].isin(STATES) & df['answer'].isin(list(answer_candidate))].iloc[::-1]
+
+    state_codes = pd.Categorical(df['state'], categories=STATES).codes.astype(np.int64)
+    candidate_codes = pd.Categorical(df['answer'].map(answer_candidate), categories=CANDIDATES).codes.astype(np.int64)
+    groups = state_codes * len(CANDIDATES) + candidate_codes
+    days = as_days(df['end_date'].to_numpy())
+    # lexsort is stable: same-day polls stay in the reversed csv order
+    order = np.lexsort((days, groups))
+    groups = groups[order]
+    return {
+        'keys': groups * DAY_SPAN + days[order],
+        'days': days[order],
+        'pct': df['pct'].to_numpy(dtype=np.float64)[order],
+        'offsets': np.searchsorted(groups, np.arange(GROUPS + 1)),
+    }
+
+
+def asof_poll_windows(asof, dates, window=POLL_WINDOW, groups=None):
+    # the latest `window` polls of every group as of every date, newest first:
+    #   pct     (dates, groups, window), 0 past each group's count
+    #   counts  (dates, groups) polls in the window
+    #   means   (dates, groups) nan without polls
+    #   latest  (dates, groups) day of the newest poll, -1 without polls
+    # with groups=None every group, reshaped to (dates, states, candidates, ...)
+    all_groups = groups is None
+    groups = np.arange(GROUPS) if all_groups else np.asarray(groups)
+    as_of = as_days(dates)
+    ends = np.searchsorted(asof['keys'], groups[None, :] * DAY_SPAN + as_of[:, None], side='right')
+    counts = np.minimum(ends - asof['offsets'][groups][None, :], window)
+    positions = ends[..., None] - 1 - np.arange(window)
+    in_window = np.arange(window) < counts[..., None]
+    # a position outside the window reads the padding at -1, masked anyway
+    pct = np.where(in_window, np.append(asof['pct'], 0.0)[np.where(in_window, positions, -1)], 0.0)
+    # summed per window length, numpy's pairwise sums (windows of 8+ polls)
+    # would group zero-padded windows differently from a mean over the polls alone
+    sums = np.zeros(counts.shape)
+    for count in np.unique(counts[counts > 0]):
+        same_count = counts == count
+        sums[same_count] = pct[same_count][:, :count].sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    latest = np.where(counts > 0, np.append(asof['days'], -1)[np.where(counts > 0, ends - 1, -1)], -1)
+
+    windows = {'pct': pct, 'counts': counts, 'means': means, 'latest': latest}
+    if all_groups:
+        windows = {name: array.reshape(len(as_of), len(STATES), len(CANDIDATES), *array.shape[2:])
+                   for name, array in windows.items()}
+    return windows
+
+
+def latest_polls(asof, state, candidate, as_of, window=POLL_WINDOW):
+    # pct of the latest polls of one state and candidate as of a date, newest first
+    windows = asof_poll_windows(asof, [as_of], window, groups=[group_of(state, candidate)])
+    return windows['pct'][0, 0, :windows['counts'][0, 0]]
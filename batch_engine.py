@@ -0,0 +1,136 @@
+# vectorized Monte Carlo engine: simulates a whole batch of elections
+# with one uniform draw matrix instead of a python loop per simulation
+
+import numpy as np
+from electoral_numbers import ELECTORAL_NUMBERS
+from samplers import uniform_draws
+
+# canonical state order used by every array in the engine
+STATES = [state_info['state'] for state_info in ELECTORAL_NUMBERS]
+VOTES = np.array([state_info['votes'] for state_info in ELECTORAL_NUMBERS], dtype=np.int64)
+
+# simulations drawn per uniform matrix, keeps the float64 draws around 40MB
+CHUNK_SIZE = 100_000
+# simulations per piece of the state analytics update, which keeps its sort
+# order, cumulative votes and flipped differences to a few MB whatever the chunk
+ANALYTICS_ROWS = 1024
+# votes and vote differences (at most 538) fit int16
+VOTES_INT16 = VOTES.astype(np.int16)
+
+
+def simulation_chunks(number_of_simulations, chunk_size=CHUNK_SIZE):
+    # (chunk_index, start, stop) for every chunk of a date's simulations
+    return [
+        (chunk_index, start, min(start + chunk_size, number_of_simulations))
+        for chunk_index, start in enumerate(range(0, number_of_simulations, chunk_size))
+    ]
+
+
+def chunk_rng(seed, date_object, chunk_index):
+    # independent stream per (date, chunk) derived from one master seed, so a
+    # run gives the same draws however its chunks are spread over processes;
+    # seed=None draws fresh entropy
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(date_object.toordinal(), chunk_index)))
+
+
+def electoral_votes(trump_wins):
+    # Trump's votes per simulation; an int16 product instead of the int64
+    # copy of the whole winners matrix that bool @ VOTES makes
+    return (trump_wins.astype(np.int16) @ VOTES_INT16).astype(np.int64)
+
+
+def new_state_analytics():
+    # per-state counters filled while simulating, see update_state_analytics
+    return {
+        'simulations': 0,
+        'trump_wins': np.zeros(len(STATES), dtype=np.int64),
+        'tipping_points': np.zeros(len(STATES), dtype=np.int64),
+        'decisive': np.zeros(len(STATES), dtype=np.int64),
+    }
+
+
+def update_state_analytics(analytics, margins, trump_wins, covered_votes):
+    # margins: (simulations x states) Trump's margin in each simulated state,
+    # positive where he wins it and nan where nobody gets the votes
+    analytics['simulations'] += len(trump_wins)
+    analytics['trump_wins'] += trump_wins.sum(axis=0)
+    for start in range(0, len(trump_wins), ANALYTICS_ROWS):
+        piece_margins = margins[start:start + ANALYTICS_ROWS]
+        piece_wins = trump_wins[start:start + ANALYTICS_ROWS]
+        difference = 2 * electoral_votes(piece_wins) - covered_votes
+
+        # tipping point: the winner's states from safest to closest, the one whose
+        # votes take the winner past half the covered votes (ties have none)
+        decided = difference != 0
+        winner_margins = np.where((difference > 0)[:, None], piece_margins, -piece_margins)[decided]
+        order = np.argsort(-np.nan_to_num(winner_margins, nan=-np.inf), axis=1)
+        cumulative_votes = np.cumsum(VOTES_INT16[order], axis=1, dtype=np.int16)
+        tipping = np.argmax(cumulative_votes > covered_votes // 2, axis=1)
+        analytics['tipping_points'] += np.bincount(order[np.arange(len(order)), tipping], minlength=len(STATES))
+
+        # decisive: flipping the state alone changes who wins (or turns a win into a tie)
+        flipped = difference[:, None] + np.where(piece_wins, -2 * VOTES_INT16, 2 * VOTES_INT16)
+        decisive = (np.sign(flipped) != np.sign(difference)[:, None]) & ~np.isnan(piece_margins)
+        analytics['decisive'] += decisive.sum(axis=0)
+
+
+def merge_state_analytics(parts):
+    merged = new_state_analytics()
+    for part in parts:
+        for key in merged:
+            merged[key] = merged[key] + part[key]
+    return merged
+
+
+def simulate_batch(trump_probs, number_of_simulations, rng=None, chunk_size=CHUNK_SIZE, sampler="iid", analytics=None):
+    # trump_probs: P(Trump wins) per state as a fraction in STATES order,
+    # nan for states without polls for both candidates (nobody gets their votes);
+    # sampler is one of samplers.SAMPLERS, applied within each chunk;
+    # analytics (from new_state_analytics) is updated chunk by chunk when given
+    if rng is None:
+        rng = np.random.default_rng()
+    trump_probs = np.asarray(trump_probs, dtype=np.float64)
+    covered = ~np.isnan(trump_probs)
+    thresholds = np.where(covered, trump_probs, 0.0)
+    covered_votes = int(VOTES[covered].sum())
+
+    trump_wins = np.empty((number_of_simulations, len(STATES)), dtype=bool)
+    for start in range(0, number_of_simulations, chunk_size):
+        stop = min(start + chunk_size, number_of_simulations)
+        draws = uniform_draws(sampler, stop - start, len(STATES), rng)
+        trump_wins[start:stop] = draws < thresholds
+        if analytics is not None:
+            # Trump wins the state when the draw falls below his probability;
+            # the draws are done with, the margins take their memory
+            update_state_analytics(analytics, np.subtract(trump_probs, draws, out=draws), trump_wins[start:stop], covered_votes)
+
+    trump_votes = electoral_votes(trump_wins)
+    harris_votes = covered_votes - trump_votes
+    return trump_wins, trump_votes, harris_votes
+
+
+def count_winners(trump_votes, harris_votes):
+    trump_counter = int(np.count_nonzero(trump_votes > harris_votes))
+    harris_counter = int(np.count_nonzero(trump_votes < harris_votes))
+    tie_counter = len(trump_votes) - trump_counter - harris_counter
+    return trump_counter, harris_counter, tie_counter
+
+
+def materialize_results(trump_wins, state_details):
+    # rebuild the dict-per-state results of the python engine,
+    # state_details maps each covered state to its Trump/Harris/votes/date entry
+    covered_states = [(i, state) for i, state in enumerate(STATES) if state in state_details]
+    results_results = []
+    for row in trump_wins:
+        results = {}
+        for i, state in covered_states:
+            details = state_details[state]
+            results[state] = {
+                'Trump': details['Trump'],
+                'Harris': details['Harris'],
+                'votes': details['votes'],
+                'winner': 'Trump' if row[i] else 'Harris',
+                'date': details['date']
+            }
+        results_results.append(results)
+    return results_results
@@ -0,0 +1,68 @@
+# correlated-error engine: every simulation shares a national swing and a
+# regional swing between states, so polling misses move states together
+# instead of cancelling out like the independent draws do
+
+from functools import lru_cache
+import numpy as np
+from batch_engine import STATES, VOTES, CHUNK_SIZE, electoral_votes, update_state_analytics
+from electoral_numbers import STATE_REGIONS
+from model_snapshot import MARGIN_OF_ERROR, UNDECIDED
+from samplers import normal_draws
+
+# shares of each state's error variance coming from the national and the
+# regional swing, the rest is state-specific; the total per-state variance
+# is the one of election_probability so each state's P(win) is unchanged
+NATIONAL_SHARE = 0.5
+REGIONAL_SHARE = 0.2
+
+
+@lru_cache(maxsize=None)
+def correlation_cholesky(national_share=NATIONAL_SHARE, regional_share=REGIONAL_SHARE):
+    # factored once per configuration, the dates only rescale and shift the draws;
+    # at a sum of 1 the states of a region are perfectly correlated and the
+    # matrix is singular
+    if national_share < 0 or regional_share < 0 or national_share + regional_share >= 1:
+        raise ValueError("national and regional shares must be non-negative and sum to less than 1")
+    regions = np.array([STATE_REGIONS[state] for state in STATES])
+    correlation = national_share + regional_share * np.equal.outer(regions, regions)
+    np.fill_diagonal(correlation, 1.0)
+    cholesky = np.linalg.cholesky(correlation)
+    cholesky.setflags(write=False)
+    return cholesky
+
+
+def state_margins(snapshot, moe=MARGIN_OF_ERROR, uv=UNDECIDED):
+    # Trump's expected spread per state (nan without polls) and the spread's
+    # standard deviation, as used by election_probability
+    pct_a = snapshot['trump_pct'].to_numpy(dtype=np.float64)
+    pct_b = snapshot['harris_pct'].to_numpy(dtype=np.float64)
+    spread = (pct_a - pct_b) / (pct_a + pct_b) * (100 - uv)
+    spread_sd = moe / 1.96 * np.sqrt(2)
+    return spread, spread_sd
+
+
+def simulate_correlated_batch(snapshot, number_of_simulations, rng=None,
+                              national_share=NATIONAL_SHARE, regional_share=REGIONAL_SHARE,
+                              moe=MARGIN_OF_ERROR, uv=UNDECIDED, chunk_size=CHUNK_SIZE, sampler="iid", analytics=None):
+    # same outputs (and analytics) as batch_engine.simulate_batch
+    if rng is None:
+        rng = np.random.default_rng()
+    spread, spread_sd = state_margins(snapshot, moe, uv)
+    covered = ~np.isnan(spread)
+    covered_votes = int(VOTES[covered].sum())
+    cholesky_t = correlation_cholesky(national_share, regional_share).T
+
+    trump_wins = np.empty((number_of_simulations, len(STATES)), dtype=bool)
+    for start in range(0, number_of_simulations, chunk_size):
+        stop = min(start + chunk_size, number_of_simulations)
+        # scaled and shifted in place, no further chunk-sized arrays
+        margins = normal_draws(sampler, stop - start, len(STATES), rng) @ cholesky_t
+        margins *= spread_sd
+        margins += spread
+        trump_wins[start:stop] = (margins > 0) & covered
+        if analytics is not None:
+            update_state_analytics(analytics, margins, trump_wins[start:stop], covered_votes)
+
+    trump_votes = electoral_votes(trump_wins)
+    harris_votes = covered_votes - trump_votes
+    return trump_wins, trump_votes, harris_votes
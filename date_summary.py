@@ -0,0 +1,84 @@
+# small per-date summary written next to a date's simulations, so the site
+# (gen_visuals.py) is built without opening the per-simulation results:
+#
+#   data/historical/summary_<date>_<N|adaptive>.json
+#       counts                    Trump / Harris / tie wins
+#       ev_difference_histogram   {trump - harris votes: simulations}, non-zero bins only
+#       top_combinations          most frequent simulated maps (mask, votes, frequency)
+#       most_probable_maps        exact most probable maps (mask, votes, probability)
+#       least_likely_wins         per candidate, the least likely winning map found
+#                                 by importance sampling (None when they cannot win)
+#       snapshot                  the model snapshot the maps decode against
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from batch_engine import chunk_rng
+from exact_engine import TOTAL_VOTES, most_probable_maps
+from importance_sampling import UPSET_SIMULATIONS, least_likely_win
+from model_snapshot import SNAPSHOT_COLUMNS, snapshot_probabilities
+from poll_fetch import write_atomically
+
+SUMMARY_TOP_COMBINATIONS = 10
+SUMMARY_PROBABLE_MAPS = 5
+# seed of the importance-sampled improbable maps, so reruns find the same maps
+IMPROBABLE_MAPS_SEED = 0
+
+
+def summary_file(date_part, sims_tag, directory="data/historical"):
+    return f"{directory}/summary_{date_part}_{sims_tag}.json"
+
+
+def map_records(maps, columns):
+    # json-ready rows, masks and votes as exact ints
+    return [
+        {column: int(row[column]) if column != 'probability' else float(row[column]) for column in columns}
+        for row in maps.to_dict('records')
+    ]
+
+
+def ev_difference_histogram(trump_votes, harris_votes):
+    difference = np.asarray(trump_votes, dtype=np.int64) - np.asarray(harris_votes, dtype=np.int64)
+    return np.bincount(difference + TOTAL_VOTES, minlength=2 * TOTAL_VOTES + 1)
+
+
+def date_summary(snapshot, date_object, number_of_simulations, counts, histogram, combination_counts):
+    # histogram holds the simulations per trump - harris difference, offset by TOTAL_VOTES
+    # (streaming's ev_difference_histogram, or ev_difference_histogram above)
+    least_likely_wins = {}
+    for index, candidate in enumerate(("Harris", "Trump")):
+        least_likely = least_likely_win(snapshot, candidate, UPSET_SIMULATIONS, chunk_rng(IMPROBABLE_MAPS_SEED, date_object, index))
+        least_likely_wins[candidate] = None if least_likely is None else {
+            'mask': least_likely['mask'],
+            'trump_votes': int(least_likely['trump_votes']),
+            'harris_votes': int(least_likely['harris_votes']),
+            'probability': float(least_likely['probability']),
+        }
+    differences = np.flatnonzero(histogram)
+    return {
+        'date': date_object.strftime('%Y_%m_%d'),
+        'number_of_simulations': int(number_of_simulations),
+        'counts': dict(zip(('trump', 'harris', 'tie'), (int(count) for count in counts))),
+        'ev_difference_histogram': {int(difference - TOTAL_VOTES): int(histogram[difference]) for difference in differences},
+        'top_combinations': map_records(combination_counts.head(SUMMARY_TOP_COMBINATIONS),
+                                        ['mask', 'frequency', 'trump_votes', 'harris_votes']),
+        'most_probable_maps': map_records(most_probable_maps(snapshot_probabilities(snapshot), SUMMARY_PROBABLE_MAPS),
+                                          ['mask', 'trump_votes', 'harris_votes', 'probability']),
+        'least_likely_wins': least_likely_wins,
+        # nan stays nan through python's json, the probabilities round-trip exactly
+        'snapshot': snapshot.to_dict('records'),
+    }
+
+
+def save_date_summary(summary, file_name):
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    write_atomically(file_name, lambda file: file.write(json.dumps(summary).encode()))
+
+
+def load_date_summary(file_name):
+    with open(file_name) as file:
+        summary = json.load(file)
+    summary['ev_difference_histogram'] = {int(difference): count for difference, count in summary['ev_difference_histogram'].items()}
+    summary['snapshot'] = pd.DataFrame(summary['snapshot'], columns=SNAPSHOT_COLUMNS)
+    return summary
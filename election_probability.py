@@ -1,6 +1,6 @@
 import math
 
-def election_probability(pa, pb, moe, uv):
+def election_probability(pa, pb, moe, uv=0):
     # Adjust for undecided voters
     total = pa + pb
     adj_pa = pa / total * (100 - uv)
@@ -20,12 +20,26 @@ def election_probability(pa, pb, moe, uv):
     
     return probability * 100  # Return as percentage
 
-# Example usage
-pa = 46
-pb = 45
-moe = 3
-uv = 10
+def election_probability_gradient(pa, pb, moe, uv=0):
+    # closed-form derivatives of election_probability (in %) with respect to
+    # pa and pb (in poll points): P = Phi(z) with z = spread / (se * sqrt(2))
+    # and spread = (pa - pb) / (pa + pb) * (100 - uv)
+    total = pa + pb
+    spread = (pa - pb) / total * (100 - uv)
+    scale = moe / 1.96 * math.sqrt(2)
+    z = spread / scale
+    density = math.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+    d_spread_d_pa = 2 * pb / total ** 2 * (100 - uv)
+    d_spread_d_pb = -2 * pa / total ** 2 * (100 - uv)
+    return density * d_spread_d_pa / scale * 100, density * d_spread_d_pb / scale * 100
+
+if __name__ == "__main__":
+    # Example usage
+    pa = 46
+    pb = 45
+    moe = 3
+    uv = 10
 
-prob_a_wins = election_probability(pa, pb, moe, uv)
-print(f"Probability of Candidate A winning: {prob_a_wins:.2f}%")
-print(f"Probability of Candidate B winning: {100 - prob_a_wins:.2f}%")
\ No newline at end of file
+    prob_a_wins = election_probability(pa, pb, moe, uv)
+    print(f"Probability of Candidate A winning: {prob_a_wins:.2f}%")
+    print(f"Probability of Candidate B winning: {100 - prob_a_wins:.2f}%")
@@ -0,0 +1,197 @@
+# exact electoral vote distribution for the independent-state model:
+# convolving the per-state Bernoulli outcomes over the 0-538 range
+# replaces sampling altogether
+
+import heapq
+import numpy as np
+import pandas as pd
+from batch_engine import STATES, VOTES
+from outcome_masks import STATE_BITS
+
+# maps visited at most when looking for a candidate's top maps, so a
+# practically impossible win cannot enumerate forever
+MAX_ENUMERATED_MAPS = 1_000_000
+
+TOTAL_VOTES = int(VOTES.sum())
+WINNING_VOTES = 270
+
+
+def ev_distribution(trump_probs):
+    # pmf of Trump's electoral votes (index = votes), states with nan
+    # probability have no polls and their votes go to nobody
+    pmf = np.zeros(TOTAL_VOTES + 1)
+    pmf[0] = 1.0
+    for p, votes in zip(trump_probs, VOTES):
+        if np.isnan(p):
+            continue
+        won = np.zeros_like(pmf)
+        won[votes:] = pmf[:-votes] * p
+        pmf = pmf * (1 - p) + won
+    return pmf
+
+
+def summarize_pmf(pmf, covered_votes):
+    trump_votes = np.arange(len(pmf))
+    harris_votes = covered_votes - trump_votes
+
+    return {
+        'pmf': pmf,
+        'covered_votes': covered_votes,
+        'trump_win': float(pmf[trump_votes > harris_votes].sum()),
+        'harris_win': float(pmf[trump_votes < harris_votes].sum()),
+        'tie': float(pmf[trump_votes == harris_votes].sum()),
+        'trump_270': float(pmf[trump_votes >= WINNING_VOTES].sum()),
+        'harris_270': float(pmf[harris_votes >= WINNING_VOTES].sum()),
+    }
+
+
+def exact_outcome(trump_probs):
+    # full EV pmf plus win/tie/270+ probabilities for both candidates
+    trump_probs = np.asarray(trump_probs, dtype=np.float64)
+    covered_votes = int(VOTES[~np.isnan(trump_probs)].sum())
+    return summarize_pmf(ev_distribution(trump_probs), covered_votes)
+
+
+def leave_one_out_win_probabilities(trump_probs):
+    # for every state: P(Trump wins the election) and P(Harris wins it) when
+    # the state is won by Trump and when it is won by Harris, the rest
+    # independent as usual; from the pmfs of the states before it (prefix) and
+    # after it (suffix), one O(states x votes) pass instead of 51 convolutions.
+    # rows in STATES order, nan for states without polls
+    trump_probs = np.asarray(trump_probs, dtype=np.float64)
+    covered = np.flatnonzero(~np.isnan(trump_probs))
+    covered_votes = int(VOTES[covered].sum())
+    trump_needs = covered_votes // 2 + 1  # Trump wins with at least this many votes
+    harris_needs = (covered_votes + 1) // 2  # Harris wins when Trump has fewer than this
+
+    def add_state(pmf, p, votes):
+        won = np.zeros_like(pmf)
+        won[votes:] = pmf[:-votes] * p
+        return pmf * (1 - p) + won
+
+    prefixes = [np.eye(1, TOTAL_VOTES + 1)[0]]
+    for i in covered:
+        prefixes.append(add_state(prefixes[-1], trump_probs[i], VOTES[i]))
+    suffixes = [np.eye(1, TOTAL_VOTES + 1)[0]]
+    for i in covered[::-1]:
+        suffixes.append(add_state(suffixes[-1], trump_probs[i], VOTES[i]))
+    suffixes = suffixes[::-1]
+
+    columns = ['trump_win_if_trump', 'trump_win_if_harris', 'harris_win_if_trump', 'harris_win_if_harris']
+    table = np.full((len(VOTES), len(columns)), np.nan)
+    trump_votes = np.arange(TOTAL_VOTES + 1)
+    for position, i in enumerate(covered):
+        before, after = prefixes[position], suffixes[position + 1]
+        # at_least[m] = P(the states after have >= m Trump votes), m clipped to the pmf's range
+        at_least = np.concatenate([np.cumsum(after[::-1])[::-1], [0.0]])
+
+        def after_at_least(needed):
+            return at_least[np.clip(needed, 0, TOTAL_VOTES + 1)]
+
+        for column, state_votes in ((0, VOTES[i]), (1, 0)):
+            table[i, column] = before @ after_at_least(trump_needs - state_votes - trump_votes)
+            table[i, column + 2] = before @ (1 - after_at_least(harris_needs - state_votes - trump_votes))
+    return pd.DataFrame(table, index=STATES, columns=columns)
+
+
+def iterate_probable_maps(trump_probs):
+    # every map of the covered states, most probable first, as
+    # (log probability, Trump winners mask, Trump votes): a map is the modal
+    # map with a set of states flipped, each flip costing log(p_modal / p_other),
+    # and the sets are walked best-first (add the next cheapest flip, or move
+    # the last flip one further) so each set comes out exactly once, in order
+    trump_probs = np.asarray(trump_probs, dtype=np.float64)
+    covered = np.flatnonzero(~np.isnan(trump_probs))
+    p = np.clip(trump_probs[covered], 1e-300, 1 - 1e-16)
+    trump_modal = p >= 0.5
+    log_modal = np.log(np.where(trump_modal, p, 1 - p))
+    costs = log_modal - np.log(np.where(trump_modal, 1 - p, p))
+    order = np.argsort(costs, kind='stable')
+    costs = costs[order].tolist()
+    flip_bits = [int(STATE_BITS[i]) for i in covered[order]]
+    # Trump votes gained by each flip (lost when the modal winner is Trump)
+    flip_votes = [int(votes) for votes in np.where(trump_modal, -VOTES[covered], VOTES[covered])[order]]
+
+    modal_log_probability = float(log_modal.sum())
+    modal_mask = int(np.bitwise_or.reduce(STATE_BITS[covered[trump_modal]], initial=np.uint64(0)))
+    modal_votes = int(VOTES[covered[trump_modal]].sum())
+    yield modal_log_probability, modal_mask, modal_votes
+    if not costs:
+        return
+    heap = [(costs[0], 0, flip_bits[0], flip_votes[0])]
+    while heap:
+        cost, last, flips, votes = heapq.heappop(heap)
+        yield modal_log_probability - cost, modal_mask ^ flips, modal_votes + votes
+        following = last + 1
+        if following < len(costs):
+            heapq.heappush(heap, (cost + costs[following], following,
+                                  flips | flip_bits[following], votes + flip_votes[following]))
+            heapq.heappush(heap, (cost - costs[last] + costs[following], following,
+                                  flips ^ flip_bits[last] | flip_bits[following], votes - flip_votes[last] + flip_votes[following]))
+
+
+def maps_frame(maps, covered_votes):
+    # (log probability, mask, Trump votes) tuples as a frame, in the given order
+    trump_votes = np.array([votes for _, _, votes in maps], dtype=np.int64)
+    return pd.DataFrame({
+        'mask': np.array([mask for _, mask, _ in maps], dtype=np.int64),
+        'probability': np.exp(np.array([log_probability for log_probability, _, _ in maps], dtype=np.float64)),
+        'trump_votes': trump_votes,
+        'harris_votes': covered_votes - trump_votes,
+    })
+
+
+def most_probable_maps(trump_probs, k):
+    # the k most probable maps with their exact probabilities and EV totals
+    covered_votes = int(VOTES[~np.isnan(np.asarray(trump_probs, dtype=np.float64))].sum())
+    maps = []
+    for probable_map in iterate_probable_maps(trump_probs):
+        maps.append(probable_map)
+        if len(maps) == k:
+            break
+    return maps_frame(maps, covered_votes)
+
+
+def most_probable_maps_by_winner(trump_probs, k, max_maps=MAX_ENUMERATED_MAPS):
+    # {'Trump': frame, 'Harris': frame} with each candidate's k most probable
+    # winning maps; fewer when a candidate's wins are beyond the first max_maps maps
+    covered_votes = int(VOTES[~np.isnan(np.asarray(trump_probs, dtype=np.float64))].sum())
+    maps = {'Trump': [], 'Harris': []}
+    for visited, probable_map in enumerate(iterate_probable_maps(trump_probs), start=1):
+        trump_votes = probable_map[2]
+        harris_votes = covered_votes - trump_votes
+        winner = 'Trump' if trump_votes > harris_votes else 'Harris' if harris_votes > trump_votes else None
+        if winner is not None and len(maps[winner]) < k:
+            maps[winner].append(probable_map)
+        if all(len(winner_maps) == k for winner_maps in maps.values()) or visited >= max_maps:
+            break
+    return {winner: maps_frame(winner_maps, covered_votes) for winner, winner_maps in maps.items()}
+
+
+def ev_difference_distribution(outcome, min_probability=1e-9):
+    # Trump minus Harris votes with their probability, dropping the
+    # practically impossible outcomes so plots keep a sensible range
+    trump_votes = np.arange(len(outcome['pmf']))
+    df = pd.DataFrame({
+        'trump_votes': trump_votes,
+        'harris_votes': outcome['covered_votes'] - trump_votes,
+        'probability': outcome['pmf'],
+    })
+    df = df[df['probability'] >= min_probability]
+    df.insert(2, 'difference', df['trump_votes'] - df['harris_votes'])
+    return df.reset_index(drop=True)
+
+
+def save_ev_distribution(outcome, file_name):
+    trump_votes = np.arange(len(outcome['pmf']))
+    pd.DataFrame({
+        'trump_votes': trump_votes,
+        'harris_votes': outcome['covered_votes'] - trump_votes,
+        'probability': outcome['pmf'],
+    }).to_csv(file_name, index=False)
+
+
+def load_ev_distribution(file_name):
+    df = pd.read_csv(file_name)
+    covered_votes = int(df['trump_votes'].iloc[0] + df['harris_votes'].iloc[0])
+    return summarize_pmf(df['probability'].to_numpy(), covered_votes)
@@ -0,0 +1,88 @@
+# html figure output shared by the pipeline and gen_visuals: every file
+# references one plotly.js bundle kept next to it instead of embedding its
+# ~3.5 MB, and starts with the hash of the inputs it was rendered from, so a
+# figure whose inputs did not change is not rendered again; the election maps
+# are filled into one choropleth template instead of each building its figure
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io
+import plotly.offline
+from poll_fetch import write_atomically
+
+# versioned name: a plotly upgrade writes a new bundle and changes every input hash
+PLOTLY_BUNDLE = f"plotly-{plotly.offline.get_plotlyjs_version()}.min.js"
+INPUT_HASH_PREFIX = "<!-- inputs sha256: "
+INPUT_HASH_SUFFIX = " -->"
+# z is 0 where Trump wins, 1 where Harris does
+MAP_COLORSCALE = [[0, 'red'], [1, 'blue']]
+
+
+def ensure_plotly_bundle(directory):
+    path = os.path.join(directory, PLOTLY_BUNDLE)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        write_atomically(path, lambda file: file.write(plotly.offline.get_plotlyjs().encode()))
+    return path
+
+
+def hashable(value):
+    # json fallback: arrays by the hash of their bytes, anything else by its str
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def inputs_hash(*inputs):
+    return hashlib.sha256(json.dumps([PLOTLY_BUNDLE, inputs], sort_keys=True, default=hashable).encode()).hexdigest()
+
+
+def is_rendered(file_name, input_hash):
+    # the file exists and was rendered from the same inputs
+    if not os.path.exists(file_name):
+        return False
+    with open(file_name) as file:
+        return file.readline().rstrip("\n") == f"{INPUT_HASH_PREFIX}{input_hash}{INPUT_HASH_SUFFIX}"
+
+
+@lru_cache(maxsize=None)
+def choropleth_template(locations, width=None, height=None):
+    # json of a map over the given state abbreviations, built and validated
+    # once per set of states and size; the maps only fill in z, text and title
+    fig = go.Figure(data=go.Choropleth(
+        locations=list(locations),
+        locationmode='USA-states',
+        hoverinfo='text',
+        colorscale=MAP_COLORSCALE,
+        showscale=False,
+        marker_line_color='white',
+        marker_line_width=0.5
+    ))
+    fig.update_layout(geo_scope='usa', width=width, height=height)
+    return fig.to_plotly_json()
+
+
+def choropleth_map(locations, trump_wins, votes, title, width=None, height=None):
+    # figure json of one map from its per-state arrays (outcome_masks.map_outcome),
+    # shallow copies of the template: it is shared by every map and never changed
+    template = choropleth_template(tuple(locations), width, height)
+    winners = np.where(trump_wins, 'Trump', 'Harris')
+    trace = dict(template['data'][0],
+                 z=np.where(trump_wins, 0, 1),
+                 text=[f"{state}<br>Winner: {winner}<br>Votes: {vote}" for state, winner, vote in zip(locations, winners, votes)])
+    return {'data': [trace], 'layout': dict(template['layout'], title={'text': title})}
+
+
+def write_figure(fig, file_name, input_hash, **html_options):
+    # fig.write_html with the shared bundle next to the file; figure json
+    # (choropleth_map) is written as is, it was validated with its template
+    ensure_plotly_bundle(os.path.dirname(file_name) or ".")
+    html = plotly.io.to_html(fig, include_plotlyjs=PLOTLY_BUNDLE, validate=not isinstance(fig, dict), **html_options)
+    write_atomically(file_name, lambda file: file.write(f"{INPUT_HASH_PREFIX}{input_hash}{INPUT_HASH_SUFFIX}\n{html}".encode()))
+    return file_name
@@ -5,45 +5,46 @@ import numpy as np
 import plotly.graph_objects as go
 import pandas as pd
 from electoral_numbers import ELECTORAL_NUMBERS, STATE_ABBREVIATIONS
+from exact_engine import ev_difference_distribution
+from outcome_masks import results_to_masks, count_combination_masks, map_outcome
+from results_store import load_results, is_results_path, snapshot_from_results
+from state_analytics import state_analytics_file
+from model_snapshot import snapshot_details
+from batch_engine import count_winners
+from date_summary import summary_file, ev_difference_histogram, date_summary, save_date_summary, load_date_summary
+from datetime import datetime
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from collections import Counter
-import json
+import csv
+import argparse
 import requests
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from figure_render import PLOTLY_BUNDLE, inputs_hash, is_rendered, write_figure, choropleth_map
 
-def find_least_harris(sorted_by_count):
-    i=1
-    while True:
-        comb = sorted_by_count[len(sorted_by_count)-i]
-        i+=1
-        # print(f'{comb["combination"]["harris_votes"]} > {comb["combination"]["trump_votes"]}')
-        if comb["combination"]["harris_votes"] > comb["combination"]["trump_votes"]:
-            # print(f'Found Harris win: {comb["combination"]["harris_votes"]} > {comb["combination"]["trump_votes"]}')
-            return comb
-        if i>100:# guard
-            return None
-
-def find_least_trump(sorted_by_count):
-    i=1
-    while True:
-        comb = sorted_by_count[len(sorted_by_count)-i]
-        i+=1
-        # print(f'{comb["combination"]["harris_votes"]} > {comb["combination"]["trump_votes"]}')
-        if comb["combination"]["harris_votes"] < comb["combination"]["trump_votes"]:
-            # print(f'Found Trump win: {comb["combination"]["harris_votes"]} > {comb["combination"]["trump_votes"]}')
-            return comb
-        if i>100:# guard
-            return None
+# processes rendering dates in parallel
+RENDER_WORKERS = os.cpu_count() or 1
+# per-state details in the Info column of the map csv files
+MAP_DETAILS = ('Trump', 'Harris', 'votes', 'date')
 
 def electoral_college_histogram(data, given_date):
-    df = pd.DataFrame(data)
-    df['difference'] = df['trump_votes'] - df['harris_votes']
-
-    df.to_csv(f"./front-end/public/data/election_map_{given_date}_histogram.html")
-
-    # Count occurrences of each unique difference
-    value_counts = df['difference'].value_counts().sort_index()
+    if isinstance(data, dict) and 'pmf' in data:
+        # exact engine outcome: plot the probability of every vote difference
+        df = ev_difference_distribution(data)
+        value_counts = df.set_index('difference')['probability']
+        y_title = 'Probability'
+    else:
+        # {trump - harris votes: simulations} from the date's summary
+        value_counts = pd.Series(data, dtype=np.int64).sort_index()
+        df = value_counts.rename_axis('difference').reset_index(name='count')
+        y_title = 'Count of Simulations'
+
+    csv_name = f"./front-end/public/data/election_map_{given_date}_histogram.html"
+    html_name = f"./front-end/public/data/visuals/election_map_{given_date}_histogram.html"
+    input_hash = inputs_hash("electoral_college_histogram", value_counts.to_dict(), y_title, given_date)
+    if is_rendered(html_name, input_hash) and os.path.exists(csv_name):
+        return [csv_name, html_name]
+    df.to_csv(csv_name)
 
     # Create the figure
     fig = go.Figure()
@@ -73,7 +74,7 @@ def electoral_college_histogram(data, given_date):
             zerolinecolor='black'
         ),
         yaxis=dict(
-            title='Count of Simulations'
+            title=y_title
         ),
         showlegend=False,
         height=325,
@@ -86,15 +87,19 @@ def electoral_college_histogram(data, given_date):
     fig.add_annotation(x=max_diff/2, y=1.05, xref="x", yref="paper", text="Trump wins", showarrow=False, font=dict(color="red"))
 
     # Show the plot
-    fig.write_html(f"./front-end/public/data/visuals/election_map_{given_date}_histogram.html",full_html=True)
+    write_figure(fig, html_name, input_hash)
+    return [csv_name, html_name]
 
 def electoral_college_visualization_scatter_plot(data,date_part):
+    html_name = f"./front-end/public/data/visuals/election_map_{date_part}_scatter.html"
+    input_hash = inputs_hash("electoral_college_visualization_scatter_plot", data['trump_votes'], data['harris_votes'], date_part)
+    if is_rendered(html_name, input_hash):
+        return [html_name]
+
     # Convert data to DataFrame
     df = pd.DataFrame(data)
-    df['difference'] = df['trump_votes'] - df['harris_votes']
-    df['winner'] = df['difference'].apply(lambda x: 'Trump' if x > 0 else 'Harris')
-
-    df.to_csv(f"./front-end/public/data/visuals/election_map_{date_part}_scatter.html")
+    df['difference'] = df['trump_votes'].astype(np.int64) - df['harris_votes'].astype(np.int64)
+    df['winner'] = np.where(df['difference'] > 0, 'Trump', 'Harris')
 
     # Create the scatter plot
     fig = go.Figure()
@@ -144,204 +149,131 @@ def electoral_college_visualization_scatter_plot(data,date_part):
     )
 
     # Show the plot
-    fig.write_html(f"./front-end/public/data/visuals/election_map_{date_part}_scatter.html",full_html=True)
-
-def render_most_improbable_harris_combination(combination, number_of_occurences,given_date, order,votes_T,votes_H):
-    df = pd.DataFrame(combination, columns=['State', 'Info'])
-    df['Winner'] = df['Info'].apply(lambda x: dict(x)['winner'])
-    df['Votes'] = df['Info'].apply(lambda x: dict(x)['votes'])
-    df['State'] = df['State'].map(STATE_ABBREVIATIONS)
-
-    df.to_csv(f"./front-end/public/data/election_map_{given_date}_most_improbable_harris.csv")
-
-    fig = go.Figure(data=go.Choropleth(
-        locations=df['State'], 
-        locationmode='USA-states', 
-        z=df['Winner'].map({'Trump': 0, 'Harris': 1}),  # 0 for Trump, 1 for Harris
-        text=df['State'] + '<br>Winner: ' + df['Winner'] + '<br>Votes: ' + df['Votes'].astype(str),
-        hoverinfo='text',
-        colorscale=[[0, 'red'], [1, 'blue']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
-    fig.update_layout(
-        title_text=f'Harris win :{number_of_occurences} times) up to {given_date}\n Trump:{votes_T} Harris:{votes_H}',
-        geo_scope='usa',
-        height=325,
-        width=590,
-    )
-    fig.write_html(f"./front-end/public/data/visuals/election_map_{given_date}_most_improbable_harris.html",full_html=True)
-
-def render_most_Nth_frequent_combination(combination, number_of_occurences,given_date, order,votes_T,votes_H):
-    df = pd.DataFrame(combination, columns=['State', 'Info'])
-    df['Winner'] = df['Info'].apply(lambda x: dict(x)['winner'])
-    df['Votes'] = df['Info'].apply(lambda x: dict(x)['votes'])
-    df['State'] = df['State'].map(STATE_ABBREVIATIONS)
-
-    df.to_csv(f"./front-end/public/data/election_map_{given_date}_most_frequent_{order}.csv")
-
-    fig = go.Figure(data=go.Choropleth(
-        locations=df['State'], 
-        locationmode='USA-states', 
-        z=df['Winner'].map({'Trump': 0, 'Harris': 1}),  # 0 for Trump, 1 for Harris
-        text=df['State'] + '<br>Winner: ' + df['Winner'] + '<br>Votes: ' + df['Votes'].astype(str),
-        hoverinfo='text',
-        colorscale=[[0, 'red'], [1, 'blue']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
-    fig.update_layout(
-        title_text=f'#{order+1} most frequent:{number_of_occurences} times) up to {given_date}\n Trump:{votes_T} Harris:{votes_H}',
-        geo_scope='usa',
-        # height=125,
-        # width=200,
-    )
-    fig.write_html(f"./front-end/public/data/visuals/election_map_{given_date}_most_frequent_{order}.html",
-                #    full_html=True
-                   )
-
-def render_most_improbable_trump_combination(combination, number_of_occurences,given_date, order,votes_T,votes_H):
-    df = pd.DataFrame(combination, columns=['State', 'Info'])
-    df['Winner'] = df['Info'].apply(lambda x: dict(x)['winner'])
-    df['Votes'] = df['Info'].apply(lambda x: dict(x)['votes'])
-    df['State'] = df['State'].map(STATE_ABBREVIATIONS)
-
-    df.to_csv(f"./front-end/public/data/election_map_{given_date}_most_improbable_trump.csv")
-
-    fig = go.Figure(data=go.Choropleth(
-        locations=df['State'], 
-        locationmode='USA-states', 
-        z=df['Winner'].map({'Trump': 0, 'Harris': 1}),  # 0 for Trump, 1 for Harris
-        text=df['State'] + '<br>Winner: ' + df['Winner'] + '<br>Votes: ' + df['Votes'].astype(str),
-        hoverinfo='text',
-        colorscale=[[0, 'red'], [1, 'blue']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
-    fig.update_layout(
-        title_text=f'Trump win :{number_of_occurences} times) up to {given_date}\n Trump:{votes_T} Harris:{votes_H}',
-        geo_scope='usa',
-        height=325,
-        width=590,
-    )
-    fig.write_html(f"./front-end/public/data/visuals/election_map_{given_date}_most_improbable_trump.html",full_html=True)
-
-def render_most_frequent_combination(combination, number_of_occurences,given_date, order,votes_T,votes_H):
-    print(f"Rendering most frequent of {given_date}...")
-    df = pd.DataFrame(combination, columns=['State', 'Info'])
-    df['Winner'] = df['Info'].apply(lambda x: dict(x)['winner'])
-    df['Votes'] = df['Info'].apply(lambda x: dict(x)['votes'])
-    df['State'] = df['State'].map(STATE_ABBREVIATIONS)
-
-    df.to_csv(f"./front-end/public/data/election_map_{given_date}_most_frequent.csv")
-
-    fig = go.Figure(data=go.Choropleth(
-        locations=df['State'], 
-        locationmode='USA-states', 
-        z=df['Winner'].map({'Trump': 0, 'Harris': 1}),  # 0 for Trump, 1 for Harris
-        text=df['State'] + '<br>Winner: ' + df['Winner'] + '<br>Votes: ' + df['Votes'].astype(str),
-        hoverinfo='text',
-        colorscale=[[0, 'red'], [1, 'blue']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
-    fig.update_layout(
-        title_text=f'Most frequent simulation ({number_of_occurences} times) with data up to {given_date}| Trump:{votes_T} Harris:{votes_H}',
-        geo_scope='usa',
-        height=500,
-        width=800,
-    )
-    fig.write_html(f"./front-end/public/data/visuals/election_map_{given_date}_most_frequent.html",full_html=True)
-
-def dict_to_tuple(d):
-    return tuple(sorted((k, dict_to_tuple(v) if isinstance(v, dict) else v) for k, v in d.items()))
-
-def count_combination_freqs(given_date_results):
-    # Convert each dictionary to a tuple of items
-    tuple_list = [dict_to_tuple(d) for d in given_date_results]
-
-    # Count the occurrences of each unique combination
-    combination_counts = Counter(tuple_list)
-
-    # Format the results as requested
-    formatted_results = [
-        {
-            "combination": json.loads(json.dumps(dict(combo))),
-            "frequency": count
+    write_figure(fig, html_name, input_hash)
+    return [html_name]
+
+def write_map_csv(csv_name, states, trump_wins, state_details):
+    # the State/Winner/Votes rows the front-end reads, Info as the state's sorted [key, value] pairs
+    with open(csv_name, 'w', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(['', 'State', 'Info', 'Winner', 'Votes'])
+        for index, (state, trump_win) in enumerate(zip(states, trump_wins)):
+            details = state_details[state]
+            info = {key: details[key] for key in MAP_DETAILS}
+            info['winner'] = 'Trump' if trump_win else 'Harris'
+            writer.writerow([index, STATE_ABBREVIATIONS[state], str([[key, info[key]] for key in sorted(info)]),
+                             info['winner'], details['votes']])
+
+def render_map(map_record, state_details, given_date, name, title, width=None, height=None):
+    # one map of the summary (its mask) as the csv and the html figure,
+    # filled into the shared choropleth template (see figure_render)
+    csv_name = f"./front-end/public/data/election_map_{given_date}_{name}.csv"
+    html_name = f"./front-end/public/data/visuals/election_map_{given_date}_{name}.html"
+    input_hash = inputs_hash("render_map", map_record['mask'], state_details, given_date, name, title, width, height)
+    if is_rendered(html_name, input_hash) and os.path.exists(csv_name):
+        return [csv_name, html_name]
+    states, trump_wins, votes = map_outcome(map_record['mask'], state_details)
+    write_map_csv(csv_name, states, trump_wins, state_details)
+    fig = choropleth_map([STATE_ABBREVIATIONS[state] for state in states], trump_wins, votes, title, width, height)
+    write_figure(fig, html_name, input_hash)
+    return [csv_name, html_name]
+
+def load_date_results(results_name):
+    # columnar results folder (see results_store), or a legacy pickle of result dicts;
+    # returns the EV totals per simulation, the winners bitmasks and the model snapshot
+    filename = f"data/historical/{results_name}"
+    if results_name.endswith(".pickle"):
+        with open(filename, 'rb') as file:
+            loaded_object = pickle.load(file)
+        data = {
+            'trump_votes': np.array([result['trump_votes'] for result in loaded_object]),
+            'harris_votes': np.array([result['harris_votes'] for result in loaded_object]),
         }
-        for combo, count in combination_counts.items()
-    ]
-
-    # sort from most frequent to least frequent combination
-    formatted_results.sort(key=lambda x: x['frequency'], reverse=True)
-    
-    return formatted_results
-
-def analyse_pickle(pickle_file):
-    filename = f"data/historical/{pickle_file}"
-    date_part = pickle_file.split("election_results_")[1].split("_100")[0]
-    # print(date_part)
-
-    with open(filename, 'rb') as file:
-        loaded_object = pickle.load(file)
-
-        electoral_college_visualization_scatter_plot(loaded_object, date_part)
-        electoral_college_histogram(loaded_object, date_part)
-
-        combination_counts = count_combination_freqs(loaded_object)
-
-
-        least_harris = find_least_harris(combination_counts)
-        least_trump = find_least_trump(combination_counts)
-
-        render_most_frequent_combination(
-                combination=combination_counts[0]["combination"]['result_details'],
-                number_of_occurences=combination_counts[0]["frequency"],
-                given_date=date_part,
-                order=0,
-                votes_T=combination_counts[0]["combination"]["trump_votes"],
-                votes_H=combination_counts[0]["combination"]["harris_votes"]
-            )
-    
-        for i in range(1,5):
-            # print(f"{date_part} #{i}")
-            render_most_Nth_frequent_combination(
-                combination=combination_counts[i]["combination"]['result_details'],
-                number_of_occurences=combination_counts[i]["frequency"],
-                given_date=date_part,
-                order=i,
-                votes_T=combination_counts[i]["combination"]["trump_votes"],
-                votes_H=combination_counts[i]["combination"]["harris_votes"]
-            )
-        if least_harris:
-            render_most_improbable_harris_combination(
-            
-                combination=least_harris["combination"]['result_details'],
-                number_of_occurences=least_harris["frequency"],
-                given_date=date_part,
-                order=0,
-                votes_T=least_harris["combination"]["trump_votes"],
-                votes_H=least_harris["combination"]["harris_votes"]
-        )
+        return data, results_to_masks(loaded_object), snapshot_from_results(loaded_object)
+
+    results = load_results(filename)
+    data = {'trump_votes': results['trump_votes'], 'harris_votes': results['harris_votes']}
+    return data, results['masks'], results['snapshot']
+
+def results_names(results_name):
+    # (date_part, sims_tag) of election_results_<date>_<N>[.pickle]
+    stem = results_name[:-len(".pickle")] if results_name.endswith(".pickle") else results_name
+    stem = stem[len("election_results_"):]
+    return stem[:len("YYYY_MM_DD")], stem[len("YYYY_MM_DD_"):]
+
+def results_summary(results_name):
+    # the date's summary sidecar, built from the results (and saved) for the
+    # runs that predate the sidecars
+    date_part, sims_tag = results_names(results_name)
+    file_name = summary_file(date_part, sims_tag)
+    if not os.path.exists(file_name):
+        print(f"summarising {results_name}")
+        data, masks, snapshot = load_date_results(results_name)
+        covered_votes = sum(details['votes'] for details in snapshot_details(snapshot).values())
+        summary = date_summary(
+            snapshot, datetime.strptime(date_part, "%Y_%m_%d").date(), len(masks),
+            count_winners(data['trump_votes'], data['harris_votes']),
+            ev_difference_histogram(data['trump_votes'], data['harris_votes']),
+            count_combination_masks(masks, covered_votes))
+        save_date_summary(summary, file_name)
+    return file_name
+
+def analyse_date(summary_name):
+    # every per-date output from the summary sidecar, the per-simulation
+    # results are only opened for the scatter plot; returns the files it
+    # wrote, or left in place when their inputs had not changed
+    print(f"analysing {summary_name}")
+    summary = load_date_summary(f"data/historical/{summary_name}")
+    date_part = summary['date']
+    state_details = snapshot_details(summary['snapshot'])
+
+    written = electoral_college_histogram(summary['ev_difference_histogram'], date_part)
+    results_name = f"election_results_{date_part}_{summary['number_of_simulations']}"
+    if not is_results_path(f"data/historical/{results_name}"):
+        results_name += ".pickle"
+    if os.path.exists(f"data/historical/{results_name}"):
+        data, _, _ = load_date_results(results_name)
+        written += electoral_college_visualization_scatter_plot(data, date_part)
+    else:
+        # streaming runs keep no per-simulation results
+        print(f"{date_part}: no per-simulation results, no scatter plot")
+
+    # tipping-point/decisiveness table written by the simulation run, next to winning_combinations_counts.csv
+    if os.path.exists(state_analytics_file(date_part)):
+        written.append(shutil.copy(state_analytics_file(date_part), f"./front-end/public/data/state_analytics_{date_part}.csv"))
+
+    # the most probable maps were enumerated exactly from the snapshot's probabilities
+    # and the least likely winning maps found by importance sampling tilted toward
+    # each candidate, the simulated counts are too thin at both ends
+    top_maps = summary['most_probable_maps']
+    least_likely = summary['least_likely_wins']
+
+    for i, top_map in enumerate(top_maps):
+        votes = f"Trump:{top_map['trump_votes']} Harris:{top_map['harris_votes']}"
+        if i == 0:
+            written += render_map(top_map, state_details, date_part, "most_frequent",
+                                  f"Most probable map (p={top_map['probability']:.2%}) with data up to {date_part}| {votes}",
+                                  width=800, height=500)
         else:
-            print(f"{date_part} is None")
-
-        render_most_improbable_trump_combination(
-            combination=least_trump["combination"]['result_details'],
-            number_of_occurences=least_trump["frequency"],
-            given_date=date_part,
-            order=0,
-            votes_T=least_trump["combination"]["trump_votes"],
-            votes_H=least_trump["combination"]["harris_votes"]
-        )
-    
+            written += render_map(top_map, state_details, date_part, f"most_frequent_{i}",
+                                  f"#{i+1} most probable (p={top_map['probability']:.2%}) up to {date_part}\n {votes}")
+    for candidate in ("Harris", "Trump"):
+        least_likely_map = least_likely[candidate]
+        if least_likely_map is None:
+            # only when every state is decided for the other candidate
+            print(f"{date_part}: {candidate} cannot win")
+            continue
+        votes = f"Trump:{least_likely_map['trump_votes']} Harris:{least_likely_map['harris_votes']}"
+        written += render_map(least_likely_map, state_details, date_part, f"most_improbable_{candidate.lower()}",
+                              f"{candidate} win (p={least_likely_map['probability']:.2g}) up to {date_part}\n {votes}",
+                              width=590, height=325)
+    return written
+
 def iterate_pickles_directory(directory,dates=None):
     filtered_files_list = []
-    files =  [f for f in os.listdir(directory) if f.endswith("pickle")]
+    # columnar results folders, and the legacy pickles of dates not converted yet
+    columnar = [f for f in os.listdir(directory) if f.startswith("election_results_") and is_results_path(os.path.join(directory, f))]
+    files = columnar + [f for f in os.listdir(directory) if f.endswith("pickle") and f[:-len(".pickle")] not in columnar]
     for file in files:
             if dates:
                 if any(date in file for date in dates):
@@ -350,34 +282,34 @@ def iterate_pickles_directory(directory,dates=None):
                 filtered_files_list.append(file)
 
     #filter further for only the 1000 simulations files
-    filtered_files_list = [fi for fi in filtered_files_list if "_1000." in fi]
+    filtered_files_list = [fi for fi in filtered_files_list if "_1000." in fi or fi.endswith("_1000")]
 
     return filtered_files_list
 
-def export_simulations_trendline(full_pickles_files):
+def iterate_summaries(directory, dates=None, sims_tag="1000"):
+    # summary sidecars of the runs with sims_tag simulations ("adaptive" for
+    # --target-width runs), built first for the results without one
+    for results_name in iterate_pickles_directory(directory, dates):
+        results_summary(results_name)
+    summaries = sorted(f for f in os.listdir(directory) if f.startswith("summary_") and f.endswith(f"_{sims_tag}.json"))
+    if dates:
+        summaries = [f for f in summaries if any(date in f for date in dates)]
+    return summaries
+
+def export_simulations_trendline(summaries):
     data_points = []
-    for pic in full_pickles_files:
-        # print(pic)
-        filename = f"data/historical/{pic}"
-        date_part = pic.split("election_results_")[1].split("_100")[0]
-        # print(date_part)
-
-        with open(filename, 'rb') as file:
-            loaded_object = pickle.load(file)
-            # print(loaded_object)
-            df = pd.DataFrame(loaded_object)
-            df['difference'] = df['trump_votes'] - df['harris_votes']
-            df['winner'] = df['difference'].apply(lambda x: 'Trump' if x > 0 else 'Harris')
-            harris_winning_combinations_ctn = df[df['winner']=='Harris']['winner'].count()
-            trump_winning_combinations_ctn  = df[df['winner']=='Trump']['winner'].count()
-            data_points.append({
-                "date":date_part,
-                "harris_winning_combinations_ctn":int(harris_winning_combinations_ctn),
-                "trump_winning_combinations_ctn":int(trump_winning_combinations_ctn)
-            })
+    for summary_name in summaries:
+        counts = load_date_summary(f"data/historical/{summary_name}")['counts']
+        # ties count for Harris, as before
+        data_points.append({
+            "date": summary_name[len("summary_"):len("summary_YYYY_MM_DD")],
+            "harris_winning_combinations_ctn": counts['harris'] + counts['tie'],
+            "trump_winning_combinations_ctn": counts['trump']
+        })
     
     df = pd.DataFrame(data_points)
     df.to_csv(f"./front-end/public/data/winning_combinations_counts.csv")
+    return "./front-end/public/data/winning_combinations_counts.csv"
 
 def fetch_kalshi_data(given_date):
     pass
@@ -397,6 +329,18 @@ def clear_out_dir(directory_path):
             shutil.rmtree(item_path)
     print(f"Cleared contents of {directory_path}")
 
+def remove_stale_files(directory_path, keep):
+    # everything under directory_path but the files in keep and the plotly.js bundles
+    keep = {os.path.normpath(path) for path in keep}
+    removed = 0
+    for root, _, names in os.walk(directory_path):
+        for name in names:
+            path = os.path.normpath(os.path.join(root, name))
+            if path not in keep and name != PLOTLY_BUNDLE:
+                os.unlink(path)
+                removed += 1
+    print(f"Removed {removed} stale files from {directory_path}")
+
 def make_dirs(directory_path):
     try:
         # Create the directory
@@ -407,6 +351,11 @@ def make_dirs(directory_path):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the site's csv files and figures from the simulation summaries")
+    # the runs to show: their number of simulations, or "adaptive" for --target-width runs
+    parser.add_argument("--sims", default="1000", help="simulations per date of the runs to show, or adaptive")
+    args = parser.parse_args()
+
     dates = [
         # "2024_10_27", 
         # "2024_10_28", 
@@ -420,24 +369,18 @@ if __name__ == "__main__":
         ]
     latest_date = "2024_11_04"
     
-    # clear out front-end/public/data folder
-    # clear_out_dir("./front-end/public/data/visuals")
-    clear_out_dir("./front-end/public/data")
     make_dirs("./front-end/public/data/visuals")
 
-    
-    # only the dates above
-    pickles_files = iterate_pickles_directory("./data/historical",dates)
-
-    for pickle_file in pickles_files:
-        print(f"analysing {pickle_file}")
-        analyse_pickle(pickle_file)
-
-    analyse_pickle(f"election_results_{latest_date}_1000.pickle")
+    # only the dates above and the latest one, from their summaries, one date per
+    # process; figures whose inputs did not change since the last run are kept
+    summaries = iterate_summaries("./data/historical", dates + [latest_date], args.sims)
+    with ProcessPoolExecutor(max_workers=min(RENDER_WORKERS, max(len(summaries), 1))) as pool:
+        written = [path for paths in pool.map(analyse_date, summaries) for path in paths]
 
     # all dates available
-    full_pickles_files = iterate_pickles_directory("./data/historical")
-    # print(full_pickles_files)
-    export_simulations_trendline(full_pickles_files)
+    written.append(export_simulations_trendline(iterate_summaries("./data/historical", sims_tag=args.sims)))
+
+    # what earlier runs wrote for dates no longer rendered
+    remove_stale_files("./front-end/public/data", written)
 
     fetch_kalshi_data(dates[-1])
@@ -1,69 +1,38 @@
 # extension of historical pipeline with the change 
 # of running the simulation at a given day
 
-import pandas as pd
-import math
+import numpy as np
 import random
-from collections import Counter
-import json
-import plotly.graph_objects as go
-from datetime import datetime, date, timedelta
-import requests
-import os 
-import pickle
-from electoral_numbers import ELECTORAL_NUMBERS, STATE_ABBREVIATIONS
+from datetime import datetime, timedelta
+from electoral_numbers import STATE_ABBREVIATIONS
+from model_snapshot import MARGIN_OF_ERROR, UNDECIDED, build_model_snapshot, asof_model_snapshots, snapshot_probabilities, snapshot_details, save_model_snapshot
+from poll_index import CANDIDATE_ALIASES, POLL_WINDOW
+from asof_polls import build_asof_polls
+from batch_engine import count_winners, materialize_results, simulation_chunks, new_state_analytics
+from exact_engine import exact_outcome, save_ev_distribution
+from samplers import SAMPLERS
+from parallel_runner import BATCH_ENGINES, simulate_snapshot_chunks, simulate_dates_parallel
+from outcome_masks import encode_outcomes, results_to_masks, count_combination_masks, map_outcome
+from results_store import results_path, save_results
+from streaming import MEMORY_BUDGET_MB, simulate_streaming, aggregate_combination_counts, save_aggregate
+from adaptive_stopping import TOP_K, MAX_SIMULATIONS, simulate_adaptive
+from state_analytics import state_analytics_file, save_state_analytics
+from sensitivity import sensitivity_report, sensitivity_file, save_sensitivity_report
+from poll_fetch import LATEST_POLLS_FILE, fetch_polls, pinned_polls
+from poll_loader import load_polls
+from poll_store import ingest_polls
+from figure_render import inputs_hash, is_rendered, write_figure, choropleth_map
+from date_summary import summary_file, ev_difference_histogram, date_summary, save_date_summary
+from result_cache import RESULT_CACHE_BUDGET_MB, load_result_cache, save_result_cache, date_cache_key, is_cached, record_outputs, evict_outputs, cache_report
+import argparse
 from tqdm import tqdm
 
+# master seed of a run without --seed
+DEFAULT_SEED = 0
 
-def election_probability(pa, pb, moe, uv=0):
-    # Adjust for undecided voters
-    total = pa + pb
-    adj_pa = pa / total * (100 - uv)
-    adj_pb = pb / total * (100 - uv)
-    
-    # Calculate spread
-    spread = adj_pa - adj_pb
-    
-    # Calculate standard error
-    se = moe / 1.96
-    
-    # Calculate z-score
-    z = spread / (se * math.sqrt(2))
-    
-    # Use error function to calculate probability
-    probability = 0.5 * (1 + math.erf(z / math.sqrt(2)))
-    
-    return probability * 100 
-
-def getLatestPollOfStateAndCandidateAtTime(df, state, candidateA, candidateB, verbose=True):
-    
-    
-    # Filter the dataframe for the given state, candidates, and date
-    state_candidate_polls = df[
-        (df['state'] == state) & 
-        ((df['answer'] == candidateA) | (df['answer'] == candidateB))
-    ]
-    
-    if state_candidate_polls.empty:
-        if verbose:
-            print(f"No polls found for {candidateA} or {candidateB} in {state}")
-        return None
-    
-    # Sort by end_date in descending order and get the first row
-    latest_poll = state_candidate_polls.sort_values('end_date', ascending=False).iloc[0]
 
-    # get the mean of the last 5
-    mean_pct = state_candidate_polls.sort_values('end_date', ascending=False).head(5)["pct"].mean()
-    # print(latest_poll['pct'] , mean_pct)
-    
-    return {
-        'state': state,
-        'candidate': candidateA,
-        'percentage': mean_pct,#latest_poll['pct'],
-        'poll_date': latest_poll['end_date'].strftime("%m/%d/%y")
-    }
-
-def simulate_election_with_probability_at_time(poll_data, given_date, verbose = False, sim_counter=None):
+def simulate_election_with_probability_at_time(state_details, given_date, verbose = False, sim_counter=None, rng=random):
+    # state_details comes from the date's model snapshot, only sampling happens here
     if verbose and sim_counter:
         print(f"Running simulation #{sim_counter} for {given_date}")
 
@@ -71,43 +40,30 @@ def simulate_election_with_probability_at_time(poll_data, given_date, verbose =
     total_votes_a = 0
     total_votes_b = 0
 
-    for state_info in ELECTORAL_NUMBERS:
-        state = state_info['state']
-        votes = state_info['votes']
-
-        candidate_a_result = getLatestPollOfStateAndCandidateAtTime(poll_data, state, "Trump","Trump" , verbose=verbose)
-        candidate_b_result = getLatestPollOfStateAndCandidateAtTime(poll_data, state, "Harris","Biden" , verbose=verbose)
+    for state, details in state_details.items():
+        votes = details['votes']
+        election_probability_a = details['trump_win_prob']
 
-        if candidate_a_result and candidate_b_result:
-            pct_a = candidate_a_result['percentage']
-            pct_b = candidate_b_result['percentage']
+        winner_a = rng.random()*100 < election_probability_a
+        winner_str = "Trump" if winner_a else "Harris"
 
-            election_probability_a = election_probability(pct_a,pct_b,5,0)
+        if verbose:
             election_probability_b = 100 - election_probability_a
+            print(f"{state} pct(trump|harris):{details['Trump']:.1f}|{details['Harris']:.1f} probs:{election_probability_a:.1f}|{election_probability_b:.1f} winner:{winner_str}")
+
+        results[state] = {
+            'Trump': details['Trump'],
+            'Harris': details['Harris'],
+            'votes': votes,
+            'winner': winner_str,
+            'date': details['date']
+        }
 
-            winner_a = random.random()*100 < election_probability_a
-            winner_b = not winner_a
-            winner_str = "Trump" if winner_a else "Harris"
-
-            if verbose:
-                print(f"{state} pct(trump|harris):{pct_a:.1f}|{pct_b:.1f} probs:{election_probability_a:.1f}|{election_probability_b:.1f} winner:{winner_str}")
-            
-            results[state] = {
-                'Trump': pct_a,
-                'Harris': pct_b,
-                'votes': votes,
-                'winner': 'Trump' if winner_a else 'Harris', #if pct_a > pct_b else 'Harris',
-                'date': max(candidate_a_result['poll_date'], candidate_b_result['poll_date'])
-            }
-            
-            if winner_a:#pct_a > pct_b:
-                total_votes_a += votes
-            else:
-                total_votes_b += votes
+        if winner_a:
+            total_votes_a += votes
         else:
-            if verbose:
-                print(f"Couldn't find poll data for both candidates in {state}")
-    
+            total_votes_b += votes
+
     return results, total_votes_a, total_votes_b
 
 def generate_date_list(start_date, end_date, step =1):
@@ -118,13 +74,33 @@ def generate_date_list(start_date, end_date, step =1):
         current_date += timedelta(days=step)
     return date_list
 
-def simulate_for_date(df,dat,verbose=False):
+def python_engine_rng(seed, date_object):
+    # the python engine's stream for a date, derived from the master seed like the batch chunks
+    if seed is None:
+        return random.Random()
+    return random.Random(int(np.random.SeedSequence(seed, spawn_key=(date_object.toordinal(),)).generate_state(1)[0]))
+
+def simulate_for_date(snapshot,dat,verbose=False,engine="python",materialize=True,seed=None,sampler="iid"):
+    # snapshot is the date's model snapshot (see model_snapshot.build_model_snapshot),
+    # the same seed gives the same simulations for the date with any engine
+    state_details = snapshot_details(snapshot)
+    date_object = datetime.strptime(dat, "%m/%d/%y").date()
+
+    if engine in BATCH_ENGINES:
+        trump_wins, votes_a, votes_b = simulate_snapshot_chunks(
+            snapshot, date_object, engine, simulation_chunks(NUMBER_OF_SIMULATIONS), seed, sampler)
+        trump_counter, harris_counter, tie_counter = count_winners(votes_a, votes_b)
+        # dict-per-state results are only built when something consumes them
+        results_results = materialize_results(trump_wins, state_details) if materialize else None
+        return trump_counter,harris_counter,tie_counter,results_results
+
     trump_counter = 0
     harris_counter = 0
     tie_counter = 0
     results_results = []
+    rng = python_engine_rng(seed, date_object)
     for i in tqdm(range(NUMBER_OF_SIMULATIONS)):
-        results, votes_a, votes_b = simulate_election_with_probability_at_time(df, dat, verbose=False, sim_counter=i)
+        results, votes_a, votes_b = simulate_election_with_probability_at_time(state_details, dat, verbose=False, sim_counter=i, rng=rng)
         
         if votes_a > votes_b:
             winner = "Trump"
@@ -142,6 +118,13 @@ def simulate_for_date(df,dat,verbose=False):
     return trump_counter,harris_counter,tie_counter,results_results
 
 
+def simulate_batch_date(snapshot, date_object, engine, seed, sampler="iid"):
+    # (snapshot, (trump_wins, trump_votes, harris_votes), state analytics) of a date
+    analytics = new_state_analytics()
+    batch = simulate_snapshot_chunks(snapshot, date_object, engine, simulation_chunks(NUMBER_OF_SIMULATIONS), seed, sampler, analytics)
+    return snapshot, batch, analytics
+
+
 def convert_results(results_list):
     new_results = []
     
@@ -165,83 +148,92 @@ def convert_results(results_list):
     
     return new_results
 
-def dict_to_tuple(d):
-    return tuple(sorted((k, dict_to_tuple(v) if isinstance(v, dict) else v) for k, v in d.items()))
-
-
-def count_combination_freqs(given_date_results):
-    # Convert each dictionary to a tuple of items
-    tuple_list = [dict_to_tuple(d) for d in given_date_results]
-
-    # Count the occurrences of each unique combination
-    combination_counts = Counter(tuple_list)
-
-    # Format the results as requested
-    formatted_results = [
-        {
-            "combination": json.loads(json.dumps(dict(combo))),
-            "frequency": count
-        }
-        for combo, count in combination_counts.items()
-    ]
-
-    # sort from most frequent to least frequent combination
-    formatted_results.sort(key=lambda x: x['frequency'], reverse=True)
-    
-    return formatted_results
-
-
-def render_combination(combination, number_of_occurences,given_date, order,votes_T,votes_H):
-    df = pd.DataFrame(combination, columns=['State', 'Info'])
-    df['Winner'] = df['Info'].apply(lambda x: dict(x)['winner'])
-    df['Votes'] = df['Info'].apply(lambda x: dict(x)['votes'])
-    df['State'] = df['State'].map(STATE_ABBREVIATIONS)
-
-    fig = go.Figure(data=go.Choropleth(
-        locations=df['State'], 
-        locationmode='USA-states', 
-        z=df['Winner'].map({'Trump': 0, 'Harris': 1}),  # 0 for Trump, 1 for Harris
-        text=df['State'] + '<br>Winner: ' + df['Winner'] + '<br>Votes: ' + df['Votes'].astype(str),
-        hoverinfo='text',
-        colorscale=[[0, 'red'], [1, 'blue']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
-    fig.update_layout(
-        title_text=f'Most frequent #{order} simulation ({number_of_occurences} times) with data up to {given_date}| Trump:{votes_T} Harris:{votes_H}',
-        geo_scope='usa',
-        width=750,
-        height=600
-    )
-    fig.write_html(f"data/historical/election_map_{given_date}_{order}_{NUMBER_OF_SIMULATIONS}.html")
-
-def fetch_latest_poll_data():
-    filename = f"data/president_polls_LATEST.csv"
-    csv_url = "https://projects.fivethirtyeight.com/polls/data/president_polls.csv"
-    response = requests.get(csv_url)
-
-    # Check if the request was successful
-    if response.status_code == 200:
-        # Write the content to a file
-        with open(filename, 'wb') as file:
-            file.write(response.content)
-        print(f"CSV file has been downloaded and saved as '{filename}'")
-    else:
-        print(f"Failed to download the CSV file. Status code: {response.status_code}")
-        exit()
+def render_combination(combination, state_details, given_date, order):
+    # one row of the combination counts, filled into the shared choropleth template
+    file_name = f"data/historical/election_map_{given_date}_{order}_{NUMBER_OF_SIMULATIONS}.html"
+    title = (f'Most frequent #{order} simulation ({combination["frequency"]} times) with data up to {given_date}'
+             f'| Trump:{combination["trump_votes"]} Harris:{combination["harris_votes"]}')
+    input_hash = inputs_hash("render_combination", combination['mask'], state_details, given_date, order, title)
+    if is_rendered(file_name, input_hash):
+        return file_name
+    states, trump_wins, votes = map_outcome(combination['mask'], state_details)
+    fig = choropleth_map([STATE_ABBREVIATIONS[state] for state in states], trump_wins, votes, title, width=750, height=600)
+    # plotly.js is loaded from the bundle next to the maps (see figure_render)
+    return write_figure(fig, file_name, input_hash)
+
+def fetch_latest_poll_data(pinned_sha256=None):
+    # path of the polls to run on: an earlier download when pinned, otherwise
+    # the latest file (only downloaded when it changed, see poll_fetch)
+    if pinned_sha256:
+        return pinned_polls(pinned_sha256)
+    polls = fetch_polls(LATEST_POLLS_FILE)
+    print(f"Polls sha256: {polls['sha256']} (pass --polls-sha256 to rerun on exactly these polls)")
+    return LATEST_POLLS_FILE
 
 
 if __name__ == "__main__":
-    NUMBER_OF_SIMULATIONS = 100
-    NUMBER_OF_SIMULATIONS = 1000
-    # NUMBER_OF_SIMULATIONS = 20000
-
-    fetch_latest_poll_data()
-    filename = f"data/president_polls_LATEST.csv"
-    df = pd.read_csv(filename)
-    df['end_date'] = pd.to_datetime(df['end_date'], format="%m/%d/%y")
-                                    #format='mixed',dayfirst=False, yearfirst=False)
+    parser = argparse.ArgumentParser(description="Simulate the election for every date in the range")
+    parser.add_argument("--sims", type=int, default=None,
+                        help="number of simulations per date (1000), the maximum with --target-width (1000000)")
+    # "python" loops one simulation at a time, "numpy" simulates them all in one batch,
+    # "correlated" adds national and regional polling errors shared between states,
+    # "exact" computes the electoral vote distribution without sampling
+    parser.add_argument("--engine", choices=["python", *BATCH_ENGINES, "exact"], default="numpy")
+    # "incremental" reads every date's poll windows from one sorted as-of store
+    # (asof_polls.py), "full" rebuilds every date's snapshot by filtering all polls up to that date
+    # (single worker only, parallel workers build their snapshots from the shared as-of arrays)
+    parser.add_argument("--sweep", choices=["incremental", "full"], default="incremental")
+    parser.add_argument("--workers", type=int, default=1, help="processes simulating dates in parallel (batch engines only)")
+    # the seed is part of every date's cache key, so a fixed default lets a plain
+    # rerun reuse the outputs of the previous one; another seed draws new simulations
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"master seed ({DEFAULT_SEED} by default)")
+    # streaming keeps only counters and bounded sketches per date instead of every simulation
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="stream each date's simulations within this memory budget (batch engines only)")
+    # adaptive runs stop once P(Trump win) is known within the target width,
+    # --sims is then the maximum per date
+    parser.add_argument("--target-width", type=float, default=None,
+                        help="simulate each date until the 95%% interval on P(Trump win) is this narrow (batch engines only)")
+    parser.add_argument("--stable-top", type=int, default=TOP_K, metavar="K",
+                        help="with --target-width, also simulate until the K most frequent maps are told apart from the rest")
+    # variance reduction of the batch engines' draws, see sampler_report.py
+    parser.add_argument("--sampler", choices=SAMPLERS, default="iid")
+    parser.add_argument("--polls-sha256", default=None, help="run on an earlier poll download instead of fetching the latest")
+    # the store parses only the rows new or revised since the last fetch, see poll_store.py
+    parser.add_argument("--poll-store", action="store_true", help="ingest the polls through the append-only local poll store")
+    # dates whose polls and parameters are unchanged since a previous run are skipped, see result_cache.py
+    parser.add_argument("--recompute", action="store_true", help="simulate every date even when its cached outputs are current")
+    parser.add_argument("--cache-budget", type=int, default=RESULT_CACHE_BUDGET_MB, metavar="MB",
+                        help="size of data/historical outputs kept, least recently used dates are deleted past it")
+    args = parser.parse_args()
+    if args.sampler != "iid" and args.engine not in BATCH_ENGINES:
+        parser.error(f"--sampler needs one of the batch engines {BATCH_ENGINES}")
+    if args.workers > 1 and args.engine not in BATCH_ENGINES:
+        parser.error(f"--workers needs one of the batch engines {BATCH_ENGINES}")
+    if args.workers > 1 and args.sweep == "full":
+        parser.error("--sweep full needs a single worker, the workers always read the shared as-of arrays")
+    STREAMING = args.memory_budget is not None or args.target_width is not None
+    if STREAMING and (args.engine not in BATCH_ENGINES or args.workers > 1):
+        parser.error(f"--memory-budget and --target-width need one of the batch engines {BATCH_ENGINES} and a single worker")
+    if args.poll_store and args.polls_sha256 is not None:
+        parser.error("--poll-store ingests the latest polls, it cannot be combined with --polls-sha256")
+    MEMORY_BUDGET = args.memory_budget if args.memory_budget is not None else MEMORY_BUDGET_MB
+
+    NUMBER_OF_SIMULATIONS = args.sims if args.sims is not None else (MAX_SIMULATIONS if args.target_width is not None else 1000)
+    ENGINE = args.engine
+    SWEEP = args.sweep
+    SEED = args.seed
+    print(f"Master seed: {SEED}")
+
+    filename = fetch_latest_poll_data(args.polls_sha256)
+    if args.poll_store:
+        df, poll_changes = ingest_polls(filename)
+        print(f"Poll store: {poll_changes['new_rows']} new, {poll_changes['revised_rows']} revised "
+              f"({poll_changes['reverted_rows']} reverted) and {poll_changes['removed_rows']} removed rows, "
+              f"states changed: {', '.join(poll_changes['states']) or 'none'}")
+    else:
+        # only the columns the model reads, typed, cached under the file's sha256
+        df = load_polls(filename)
 
    
     # start_date =  datetime(2024, 8, 1)   
@@ -252,37 +244,136 @@ if __name__ == "__main__":
     dates = generate_date_list(start_date, end_date, step=1)
     print(dates)
 
-    for dat in dates:
-        date_object = datetime.strptime(dat, "%m/%d/%y").date()
-        df_date = df[
-            (df['end_date'].dt.date <= date_object)
-        ]
-        
-        trump_counter,harris_counter,tie_counter,results_results = simulate_for_date(df_date,dat,verbose=False)
+    date_objects = [datetime.strptime(dat, "%m/%d/%y").date() for dat in dates]
+    asof = build_asof_polls(df)
+
+    # a date's outputs are reused while its visible polls and all of these are unchanged
+    cache_parameters = {
+        'engine': ENGINE, 'sims': NUMBER_OF_SIMULATIONS, 'seed': SEED, 'sampler': args.sampler,
+        'memory_budget': args.memory_budget, 'target_width': args.target_width,
+        'window': POLL_WINDOW, 'moe': MARGIN_OF_ERROR, 'uv': UNDECIDED, 'candidate_aliases': CANDIDATE_ALIASES,
+    }
+    if args.target_width is not None:
+        cache_parameters['stable_top'] = args.stable_top
+    result_cache = load_result_cache()
+    cache_keys = {date_object: date_cache_key(asof, date_object, cache_parameters) for date_object in date_objects}
+    if not args.recompute:
+        cached_dates = {date_object for date_object in date_objects if is_cached(result_cache, cache_keys[date_object])}
+        if cached_dates:
+            print(f"{len(cached_dates)} of {len(date_objects)} dates unchanged since a previous run, reusing their outputs")
+        dates = [dat for dat, date_object in zip(dates, date_objects) if date_object not in cached_dates]
+        date_objects = [date_object for date_object in date_objects if date_object not in cached_dates]
+
+    # everything the simulations need for a date, computed once and kept next to the results
+    if SWEEP == "incremental":
+        snapshots = (snapshot for _, snapshot in asof_model_snapshots(asof, date_objects))
+    else:
+        snapshots = (build_model_snapshot(df[df['end_date'].dt.date <= date_object]) for date_object in date_objects)
+
+    # (snapshot, simulations, state analytics) per date; the streaming aggregates
+    # carry their analytics inside
+    if args.target_width is not None:
+        date_runs = (
+            (snapshot, simulate_adaptive(snapshot, date_object, ENGINE, SEED, target_width=args.target_width, top_k=args.stable_top,
+                                         max_simulations=NUMBER_OF_SIMULATIONS, memory_budget_mb=MEMORY_BUDGET, sampler=args.sampler), None)
+            for date_object, snapshot in zip(date_objects, snapshots)
+        )
+    elif STREAMING:
+        date_runs = (
+            (snapshot, simulate_streaming(snapshot, date_object, ENGINE, NUMBER_OF_SIMULATIONS, SEED, MEMORY_BUDGET, args.sampler), None)
+            for date_object, snapshot in zip(date_objects, snapshots)
+        )
+    elif args.workers > 1:
+        # the workers build their own snapshots from the polls in shared memory
+        date_runs = simulate_dates_parallel(df, date_objects, ENGINE, NUMBER_OF_SIMULATIONS, args.workers, SEED, sampler=args.sampler)
+    elif ENGINE in BATCH_ENGINES:
+        date_runs = (
+            simulate_batch_date(snapshot, date_object, ENGINE, SEED, args.sampler)
+            for date_object, snapshot in zip(date_objects, snapshots)
+        )
+    else:
+        date_runs = ((snapshot, None, None) for snapshot in snapshots)
+
+    for dat, date_object, (snapshot, batch, analytics) in zip(dates, date_objects, date_runs):
+        date_part = date_object.strftime('%Y_%m_%d')
+        # every file written for the date, recorded in the result cache once complete
+        outputs = [f"data/historical/model_snapshot_{date_part}.csv"]
+        save_model_snapshot(snapshot, outputs[0])
+
+        if ENGINE == "exact":
+            outcome = exact_outcome(snapshot_probabilities(snapshot))
+            print(f"EXACT: Trump: {outcome['trump_win']:.4f} Harris: {outcome['harris_win']:.4f} Tie: {outcome['tie']:.4f} Trump 270+: {outcome['trump_270']:.4f}")
+            outputs += [f"data/historical/ev_distribution_{date_part}.csv", sensitivity_file(date_part)]
+            save_ev_distribution(outcome, outputs[-2])
+            save_sensitivity_report(sensitivity_report(snapshot), outputs[-1])
+            record_outputs(result_cache, cache_keys[date_object], date_part, outputs)
+            save_result_cache(result_cache)
+            continue
+
+        state_details = snapshot_details(snapshot)
+        covered_votes = sum(details['votes'] for details in state_details.values())
+        if STREAMING:
+            aggregate = batch
+            analytics = aggregate['analytics']
+            trump_counter, harris_counter, tie_counter = aggregate['counts']
+            combination_counts = aggregate_combination_counts(aggregate)
+            if args.target_width is not None:
+                low, high = aggregate['interval']
+                print(f"{dat}: {aggregate['number_of_simulations']} simulations used (stopped by {aggregate['stopped_by']}), P(Trump win) in [{low:.4f}, {high:.4f}]")
+        elif batch is None:
+            trump_counter,harris_counter,tie_counter,results_results = simulate_for_date(snapshot,dat,verbose=False,engine=ENGINE,seed=SEED)
+            given_date_results = convert_results(results_results)
+            masks = results_to_masks(given_date_results)
+            votes_a = [result['trump_votes'] for result in given_date_results]
+            votes_b = [result['harris_votes'] for result in given_date_results]
+        else:
+            trump_wins, votes_a, votes_b = batch
+            trump_counter, harris_counter, tie_counter = count_winners(votes_a, votes_b)
+            masks = encode_outcomes(trump_wins)
+        if not STREAMING:
+            combination_counts = count_combination_masks(masks, covered_votes)
             
         print(f"TOTAL: Trump: {trump_counter} Harris: {harris_counter} Tie: {tie_counter}")
+        if analytics is not None:
+            # tipping points, win frequencies and decisiveness per state (batch engines)
+            outputs.append(state_analytics_file(date_part))
+            save_state_analytics(analytics, outputs[-1])
+
+        # counts, EV histogram and maps of the date, all gen_visuals needs besides the scatter plot
+        # (adaptive runs are tagged "adaptive", the simulations used are stored inside)
+        sims_tag = "adaptive" if args.target_width is not None else NUMBER_OF_SIMULATIONS
+        if STREAMING:
+            number_of_simulations, histogram = aggregate['number_of_simulations'], aggregate['ev_difference_histogram']
+        else:
+            number_of_simulations, histogram = NUMBER_OF_SIMULATIONS, ev_difference_histogram(votes_a, votes_b)
+        outputs.append(summary_file(date_part, sims_tag))
+        save_date_summary(date_summary(snapshot, date_object, number_of_simulations, (trump_counter, harris_counter, tie_counter),
+                                       histogram, combination_counts), outputs[-1])
 
-        given_date_results = convert_results(results_results)
-
-        combination_counts = count_combination_freqs(given_date_results)
-        print(f"Most common winning combination occured: {combination_counts[0]['frequency']} times, followed by: {combination_counts[1]['frequency']}, {combination_counts[2]['frequency']}, {combination_counts[3]['frequency']}, {combination_counts[4]['frequency']} ...")
+        top_frequencies = combination_counts['frequency'].head(5).tolist()
+        print(f"Most common winning combination occured: {top_frequencies[0]} times, followed by: {', '.join(str(f) for f in top_frequencies[1:5])} ...")
 
         # store top-10 combinations render in files
-        for ord in range(0,10):
-            render_combination(
-                combination=combination_counts[ord]["combination"]['result_details'],
-                number_of_occurences=combination_counts[ord]["frequency"],
-                given_date=date_object.strftime('%Y_%m_%d'), 
-                order=ord,
-                votes_T=combination_counts[ord]["combination"]["trump_votes"],
-                votes_H=combination_counts[ord]["combination"]["harris_votes"])
+        for ord in range(0,min(10, len(combination_counts))):
+            outputs.append(render_combination(combination_counts.iloc[ord], state_details,
+                                              given_date=date_object.strftime('%Y_%m_%d'), order=ord))
         # simulate_election_with_probability_at_time(df, dat, verbose=True)
 
-        file_name = f"data/historical/election_results_{date_object.strftime('%Y_%m_%d')}_{NUMBER_OF_SIMULATIONS}.pickle"
-
-        # Save the list
-        with open(file_name, 'wb') as file:
-            pickle.dump(given_date_results, file)
+        if STREAMING:
+            # no per-simulation columns in streaming mode, only the aggregate
+            outputs.append(f"data/historical/election_stream_{date_part}_{sims_tag}.npz")
+            save_aggregate(aggregate, outputs[-1])
+        else:
+            # columnar results: snapshot once, winners bitmask and EV totals per simulation
+            outputs.append(results_path(date_part, NUMBER_OF_SIMULATIONS))
+            save_results(outputs[-1], snapshot, masks, votes_a, votes_b)
+        record_outputs(result_cache, cache_keys[date_object], date_part, outputs)
+        save_result_cache(result_cache)
+
+    # the dates of this run are kept whatever the budget
+    evict_outputs(result_cache, args.cache_budget * 2**20, keep=set(cache_keys.values()))
+    save_result_cache(result_cache)
+    print(cache_report(result_cache))
 
 
 
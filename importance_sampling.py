@@ -0,0 +1,160 @@
+# rare-event sampler for upset maps: the state probabilities are tilted
+# toward one candidate so that their wins stop being rare, and every draw is
+# reweighted by its likelihood ratio, so a few thousand draws estimate the
+# probability and the shape of maps plain sampling would need millions for
+#
+#   python importance_sampling.py --date 2024-11-04 --candidate Harris
+
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from batch_engine import STATES, VOTES, chunk_rng, simulate_batch
+from exact_engine import exact_outcome
+from model_snapshot import snapshot_probabilities, load_model_snapshot
+from outcome_masks import encode_outcomes, COMBINATION_COLUMNS
+from streaming import map_log_probabilities
+
+UPSET_SIMULATIONS = 5000
+CANDIDATES = ("Trump", "Harris")
+
+
+def candidate_probabilities(trump_probs, candidate):
+    # P(candidate wins the state), nan for the states without polls
+    return trump_probs if candidate == "Trump" else 1 - trump_probs
+
+
+def tilt_probabilities(probs, tilt):
+    # exponential tilt by the state's votes: q = p e^(tilt v) / (p e^(tilt v) + 1 - p)
+    # (certain states are kept a hair away from 0/1 so they can be tilted too)
+    covered = ~np.isnan(probs)
+    p = np.where(covered, np.clip(probs, 1e-12, 1 - 1e-12), 0.5)
+    log_odds = np.log(p) - np.log1p(-p) + tilt * VOTES
+    return np.where(covered, 1 / (1 + np.exp(-log_odds)), np.nan)
+
+
+def winning_tilt(probs, covered_votes, low=-1.0, high=1.0, iterations=60):
+    # tilt that puts the candidate's expected votes on the winning line, by bisection
+    # (the expected votes grow with the tilt)
+    target = covered_votes / 2 + 0.5
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        expected = np.nansum(tilt_probabilities(probs, middle) * VOTES)
+        if expected < target:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def log_likelihood_ratios(candidate_wins, probs, tilted):
+    # log p(x) / q(x) of every simulated map, over the covered states
+    covered = ~np.isnan(probs)
+    p = np.clip(np.where(covered, probs, 0.5), 1e-300, 1 - 1e-16)
+    q = np.clip(np.where(covered, tilted, 0.5), 1e-300, 1 - 1e-16)
+    log_win = np.where(covered, np.log(p) - np.log(q), 0.0)
+    log_loss = np.where(covered, np.log1p(-p) - np.log1p(-q), 0.0)
+    return candidate_wins @ log_win + ~candidate_wins @ log_loss
+
+
+def simulate_candidate_wins(snapshot, candidate, number_of_simulations=UPSET_SIMULATIONS, rng=None, sampler="iid"):
+    # importance-sampled estimate of P(candidate wins) and of the shape of
+    # their winning maps, each draw weighted by its likelihood ratio
+    trump_probs = snapshot_probabilities(snapshot)
+    covered_votes = int(VOTES[~np.isnan(trump_probs)].sum())
+    probs = candidate_probabilities(trump_probs, candidate)
+    tilt = winning_tilt(probs, covered_votes)
+    tilted = tilt_probabilities(probs, tilt)
+
+    trump_wins, trump_votes, harris_votes = simulate_batch(
+        candidate_probabilities(tilted, candidate), number_of_simulations, rng, sampler=sampler)
+    if candidate == "Trump":
+        candidate_wins, candidate_votes, won = trump_wins, trump_votes, trump_votes > harris_votes
+    else:
+        candidate_wins, candidate_votes, won = ~trump_wins & ~np.isnan(trump_probs), harris_votes, harris_votes > trump_votes
+
+    weights = np.exp(log_likelihood_ratios(candidate_wins, probs, tilted))
+    win_weights = weights * won
+    estimate = win_weights.mean()
+    standard_error = win_weights.std(ddof=1) / np.sqrt(number_of_simulations)
+    # effective number of independent winning draws behind the estimate
+    effective_sample_size = win_weights.sum() ** 2 / max((win_weights ** 2).sum(), 1e-300)
+
+    masks = encode_outcomes(trump_wins[won])
+    return {
+        'candidate': candidate,
+        'tilt': tilt,
+        'number_of_simulations': number_of_simulations,
+        'winning_draws': int(won.sum()),
+        'win_probability': float(estimate),
+        'standard_error': float(standard_error),
+        'effective_sample_size': float(effective_sample_size),
+        'exact_win_probability': exact_outcome(trump_probs)['trump_win' if candidate == "Trump" else 'harris_win'],
+        # P(candidate wins the state | candidate wins the election)
+        'state_win_shares': pd.Series(
+            (win_weights @ candidate_wins) / max(win_weights.sum(), 1e-300), index=STATES),
+        'expected_votes': float((win_weights @ candidate_votes) / max(win_weights.sum(), 1e-300)),
+        'masks': masks,
+        'trump_votes': trump_votes[won],
+        'harris_votes': harris_votes[won],
+        'covered_votes': covered_votes,
+        'trump_probs': trump_probs,
+    }
+
+
+def winning_maps(candidate_run):
+    # distinct winning maps drawn, with their model probability, least likely first;
+    # 'frequency' is the number of tilted draws that hit the map
+    masks, first, frequencies = np.unique(candidate_run['masks'], return_index=True, return_counts=True)
+    maps = pd.DataFrame({
+        'mask': masks.astype(np.int64),
+        'frequency': frequencies,
+        'trump_votes': candidate_run['trump_votes'][first],
+        'harris_votes': candidate_run['harris_votes'][first],
+        'probability': np.exp(map_log_probabilities(masks, candidate_run['trump_probs'])),
+    }, columns=COMBINATION_COLUMNS + ['probability'])
+    return maps.sort_values('probability', kind='stable').reset_index(drop=True)
+
+
+def least_likely_win(snapshot, candidate, number_of_simulations=UPSET_SIMULATIONS, rng=None):
+    # the least likely winning map found for the candidate, None only when the
+    # candidate cannot win at all
+    maps = winning_maps(simulate_candidate_wins(snapshot, candidate, number_of_simulations, rng))
+    if maps.empty:
+        return None
+    # a dict keeps the 51-bit mask exact, a mixed-type row would turn it into a float
+    least_likely = maps.iloc[0].to_dict()
+    least_likely['mask'] = int(maps['mask'].iloc[0])
+    return least_likely
+
+
+def upset_report(candidate_run):
+    lines = [
+        f"{candidate_run['candidate']} wins: {candidate_run['win_probability']:.4g} "
+        f"(+/- {1.96 * candidate_run['standard_error']:.2g}, exact {candidate_run['exact_win_probability']:.4g})",
+        f"  {candidate_run['winning_draws']}/{candidate_run['number_of_simulations']} tilted draws were wins, "
+        f"effective sample size {candidate_run['effective_sample_size']:.0f}, tilt {candidate_run['tilt']:.4f}",
+        f"  expected votes when winning: {candidate_run['expected_votes']:.1f}",
+        "  states most often won in those wins, beyond the safe ones:",
+    ]
+    shares = candidate_run['state_win_shares'].dropna()
+    shares = shares[(shares > 0.01) & (shares < 0.99)].sort_values(ascending=False)
+    lines += [f"    {state}: {share:.2f}" for state, share in shares.head(15).items()]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importance-sampled estimate of a candidate's (upset) wins on one date")
+    parser.add_argument("--date", required=True, help="YYYY-MM-DD, reads data/historical/model_snapshot_<date>.csv")
+    parser.add_argument("--candidate", choices=CANDIDATES, default=None, help="defaults to the underdog of the date")
+    parser.add_argument("--sims", type=int, default=UPSET_SIMULATIONS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    date_object = datetime.strptime(args.date, "%Y-%m-%d").date()
+    snapshot = load_model_snapshot(f"data/historical/model_snapshot_{date_object.strftime('%Y_%m_%d')}.csv")
+    candidate = args.candidate
+    if candidate is None:
+        outcome = exact_outcome(snapshot_probabilities(snapshot))
+        candidate = "Trump" if outcome['trump_win'] < outcome['harris_win'] else "Harris"
+    print(upset_report(simulate_candidate_wins(snapshot, candidate, args.sims, chunk_rng(args.seed, date_object, 0))))
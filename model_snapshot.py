@@ -0,0 +1,115 @@
+# per-date model snapshot: one row per state with the poll means and the
+# win probability that every simulation of that date samples from
+
+import numpy as np
+import pandas as pd
+from electoral_numbers import ELECTORAL_NUMBERS
+from election_probability import election_probability
+from poll_index import build_poll_index, lookup_poll, POLL_WINDOW
+from asof_polls import build_asof_polls, asof_poll_windows
+
+# model parameters fed to election_probability
+MARGIN_OF_ERROR = 5
+UNDECIDED = 0
+
+# rows follow the ELECTORAL_NUMBERS order, states without polls for both
+# candidates keep their row with nan pct/probability
+SNAPSHOT_COLUMNS = ['state', 'state_abbr', 'votes', 'trump_pct', 'harris_pct', 'poll_date', 'trump_win_prob']
+
+
+def snapshot_row(state_info, candidate_a_result, candidate_b_result, moe=MARGIN_OF_ERROR, uv=UNDECIDED):
+    # candidate results are poll_index entries (percentage/poll_date) or None
+    row = {
+        'state': state_info['state'],
+        'state_abbr': state_info['state_abbr'],
+        'votes': state_info['votes'],
+        'trump_pct': np.nan,
+        'harris_pct': np.nan,
+        'poll_date': None,
+        'trump_win_prob': np.nan,
+    }
+    if candidate_a_result and candidate_b_result:
+        pct_a = candidate_a_result['percentage']
+        pct_b = candidate_b_result['percentage']
+        row['trump_pct'] = pct_a
+        row['harris_pct'] = pct_b
+        row['poll_date'] = max(candidate_a_result['poll_date'], candidate_b_result['poll_date'])
+        row['trump_win_prob'] = election_probability(pct_a, pct_b, moe, uv)
+    return row
+
+
+def build_model_snapshot(df, window=POLL_WINDOW, moe=MARGIN_OF_ERROR, uv=UNDECIDED, verbose=False):
+    # df holds the polls visible at the as-of date, end_date parsed as datetime
+    poll_index = build_poll_index(df, window=window)
+
+    rows = []
+    for state_info in ELECTORAL_NUMBERS:
+        state = state_info['state']
+        candidate_a_result = lookup_poll(poll_index, state, "Trump", verbose=verbose)
+        candidate_b_result = lookup_poll(poll_index, state, "Harris", verbose=verbose)
+        if verbose and not (candidate_a_result and candidate_b_result):
+            print(f"Couldn't find poll data for both candidates in {state}")
+        rows.append(snapshot_row(state_info, candidate_a_result, candidate_b_result, moe, uv))
+
+    return pd.DataFrame(rows, columns=SNAPSHOT_COLUMNS)
+
+
+def asof_model_snapshots(asof, dates, window=POLL_WINDOW, moe=MARGIN_OF_ERROR, uv=UNDECIDED):
+    # yields (date, snapshot) from an as-of poll store (asof_polls), same
+    # snapshots as build_model_snapshot on the polls up to each date; the poll
+    # windows of all dates come from one vectorized query and a state's row is
+    # only recomputed when its polls changed since the previous date
+    windows = asof_poll_windows(asof, dates, window)
+    rows = {}
+    previous = {}
+    for date_index, as_of in enumerate(dates):
+        snapshot_rows = []
+        for state_index, state_info in enumerate(ELECTORAL_NUMBERS):
+            means = windows['means'][date_index, state_index]
+            latest = windows['latest'][date_index, state_index]
+            key = (tuple(means), tuple(latest))
+            if previous.get(state_index) != key:
+                candidate_results = [
+                    {'percentage': mean, 'poll_date': np.datetime64(int(day), 'D').astype(object).strftime("%m/%d/%y")}
+                    if day >= 0 else None
+                    for mean, day in zip(means, latest)
+                ]
+                rows[state_index] = snapshot_row(state_info, *candidate_results, moe, uv)
+                previous[state_index] = key
+            snapshot_rows.append(rows[state_index])
+        yield as_of, pd.DataFrame(snapshot_rows, columns=SNAPSHOT_COLUMNS)
+
+
+def sweep_model_snapshots(df, dates, window=POLL_WINDOW, moe=MARGIN_OF_ERROR, uv=UNDECIDED):
+    # yields (date, snapshot) for the dates, same snapshots as
+    # build_model_snapshot on the polls up to each date, from one as-of store
+    return asof_model_snapshots(build_asof_polls(df), dates, window, moe, uv)
+
+
+def snapshot_probabilities(snapshot):
+    # P(Trump wins) per state as a fraction, in the batch engine state order
+    return snapshot['trump_win_prob'].to_numpy(dtype=np.float64) / 100
+
+
+def snapshot_details(snapshot):
+    # covered states only, in the shape used by the dict-per-state results
+    covered = snapshot[snapshot['trump_win_prob'].notna()]
+    return {
+        row.state: {
+            'Trump': row.trump_pct,
+            'Harris': row.harris_pct,
+            'votes': row.votes,
+            'date': row.poll_date,
+            'trump_win_prob': row.trump_win_prob,
+        }
+        for row in covered.itertuples(index=False)
+    }
+
+
+def save_model_snapshot(snapshot, file_name):
+    snapshot.to_csv(file_name, index=False)
+
+
+def load_model_snapshot(file_name):
+    # round_trip parsing gives back the exact probabilities that were simulated
+    return pd.read_csv(file_name, dtype={'poll_date': str}, float_precision='round_trip')
@@ -0,0 +1,85 @@
+# map outcomes as uint64 bitmasks over the ELECTORAL_NUMBERS state order
+# (bit i set when Trump wins STATES[i]): combinations are counted on the
+# masks and only the rendered ones are decoded, to per-state arrays
+
+import numpy as np
+import pandas as pd
+from batch_engine import STATES, VOTES
+
+STATE_BITS = np.left_shift(np.uint64(1), np.arange(len(STATES), dtype=np.uint64))
+STATE_POSITIONS = {state: i for i, state in enumerate(STATES)}
+
+# columns of the combination counts, most frequent combination first
+COMBINATION_COLUMNS = ['mask', 'frequency', 'trump_votes', 'harris_votes']
+
+
+def encode_outcomes(trump_wins):
+    # (N x 51) bool -> N uint64
+    packed = np.packbits(trump_wins, axis=1, bitorder='little')
+    padded = np.zeros((len(packed), 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view('<u8').ravel()
+
+
+def decode_outcomes(masks):
+    # N uint64 -> (N x 51) bool
+    masks = np.asarray(masks).astype(np.uint64)
+    return (masks[:, None] & STATE_BITS) != 0
+
+
+def results_to_masks(results_list):
+    # masks of dict results shaped like convert_results' (or their result_details)
+    masks = np.zeros(len(results_list), dtype=np.uint64)
+    for i, result in enumerate(results_list):
+        details = result.get('result_details', result)
+        mask = 0
+        for state, state_data in details.items():
+            if state_data['winner'] == 'Trump':
+                mask |= 1 << STATE_POSITIONS[state]
+        masks[i] = mask
+    return masks
+
+
+def results_state_details(results_list):
+    # pct/votes/date per covered state, identical in every simulation of a date
+    details = results_list[0].get('result_details', results_list[0])
+    return {
+        state: {key: state_data[key] for key in ('Trump', 'Harris', 'votes', 'date')}
+        for state, state_data in details.items()
+    }
+
+
+def count_combination_masks(masks, covered_votes):
+    combinations, frequencies = np.unique(masks, return_counts=True)
+    return combination_frequencies(combinations, frequencies, covered_votes)
+
+
+def combination_frequencies(combinations, frequencies, covered_votes):
+    # sorted distinct masks and their counts (np.unique's, or merged ones),
+    # most frequent first with ties in mask order
+    order = np.argsort(-frequencies, kind='stable')
+    combinations = combinations[order]
+    trump_votes = decode_outcomes(combinations) @ VOTES
+    # masks use 51 bits, int64 keeps rows of the frame integer-typed
+    return pd.DataFrame({
+        'mask': combinations.astype(np.int64),
+        'frequency': frequencies[order],
+        'trump_votes': trump_votes,
+        'harris_votes': covered_votes - trump_votes,
+    }, columns=COMBINATION_COLUMNS)
+
+
+def count_combination_freqs(given_date_results):
+    # combination counts of dict results, most frequent first
+    state_details = results_state_details(given_date_results)
+    covered_votes = sum(details['votes'] for details in state_details.values())
+    return count_combination_masks(results_to_masks(given_date_results), covered_votes)
+
+
+def map_outcome(mask, state_details):
+    # one map as arrays over the covered states in name order: states,
+    # Trump wins, electoral votes
+    states = sorted(state_details)
+    trump_wins = decode_outcomes([mask])[0][[STATE_POSITIONS[state] for state in states]]
+    votes = np.array([state_details[state]['votes'] for state in states])
+    return states, trump_wins, votes
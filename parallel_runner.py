@@ -0,0 +1,114 @@
+# runs the batch engines for many dates on a process pool: the as-of poll
+# store lives once in shared memory, every worker builds its dates' snapshots from
+# them and simulates (date, chunk) tasks with the chunk's own RNG stream
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from batch_engine import VOTES, CHUNK_SIZE, simulation_chunks, chunk_rng, simulate_batch, new_state_analytics, merge_state_analytics
+from correlated_engine import simulate_correlated_batch
+from model_snapshot import asof_model_snapshots, snapshot_probabilities
+from asof_polls import ASOF_ARRAYS, build_asof_polls
+
+BATCH_ENGINES = ("numpy", "correlated")
+
+# per worker process: the attached shared memory, the as-of poll store over it
+# and the snapshots already built for its dates
+worker_state = {}
+
+
+def simulate_snapshot_chunks(snapshot, date_object, engine, chunks, seed, sampler="iid", analytics=None):
+    # trump_wins/trump_votes/harris_votes of the given chunks, concatenated in order;
+    # analytics (batch_engine.new_state_analytics) is filled along the way when given
+    parts = []
+    for chunk_index, start, stop in chunks:
+        rng = chunk_rng(seed, date_object, chunk_index)
+        if engine == "numpy":
+            parts.append(simulate_batch(snapshot_probabilities(snapshot), stop - start, rng, sampler=sampler, analytics=analytics))
+        elif engine == "correlated":
+            parts.append(simulate_correlated_batch(snapshot, stop - start, rng, sampler=sampler, analytics=analytics))
+        else:
+            raise ValueError(f"{engine} is not a batch engine, expected one of {BATCH_ENGINES}")
+    if not parts:
+        return np.empty((0, len(VOTES)), dtype=bool), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def share_poll_arrays(df):
+    # copies the as-of poll store (asof_polls) into shared memory blocks,
+    # returns the blocks (owned by the caller) and a picklable spec to attach them
+    asof = build_asof_polls(df)
+    blocks = []
+    spec = {}
+    for name in ASOF_ARRAYS:
+        array = asof[name]
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+
+def attach_poll_arrays(spec):
+    # as-of poll store whose arrays are views over the shared blocks
+    blocks = []
+    asof = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        asof[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return blocks, asof
+
+
+def init_worker(spec):
+    worker_state['blocks'], worker_state['polls'] = attach_poll_arrays(spec)
+    worker_state['snapshots'] = {}
+
+
+def simulate_worker_chunk(date_object, engine, chunk, seed, sampler):
+    snapshots = worker_state['snapshots']
+    if date_object not in snapshots:
+        _, snapshots[date_object] = next(asof_model_snapshots(worker_state['polls'], [date_object]))
+    snapshot = snapshots[date_object]
+
+    analytics = new_state_analytics()
+    trump_wins, trump_votes, harris_votes = simulate_snapshot_chunks(snapshot, date_object, engine, [chunk], seed, sampler, analytics)
+    # bit-packed winners keep the results sent back to the parent small
+    return snapshot, np.packbits(trump_wins, axis=1), trump_votes.astype(np.int16), harris_votes.astype(np.int16), analytics
+
+
+def simulate_dates_parallel(df, date_objects, engine, number_of_simulations, workers, seed, chunk_size=CHUNK_SIZE, sampler="iid"):
+    # yields (snapshot, (trump_wins, trump_votes, harris_votes), analytics) per date
+    # in order, identical to simulate_snapshot_chunks for any number of workers
+    if engine not in BATCH_ENGINES:
+        raise ValueError(f"{engine} is not a batch engine, expected one of {BATCH_ENGINES}")
+    chunks = simulation_chunks(number_of_simulations, chunk_size)
+    blocks, spec = share_poll_arrays(df)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(spec,)) as pool:
+            pending = deque()
+            remaining_dates = iter(date_objects)
+            # only a couple of dates per worker in flight, so memory does not grow with the date range
+            for date_object in remaining_dates:
+                pending.append([pool.submit(simulate_worker_chunk, date_object, engine, chunk, seed, sampler) for chunk in chunks])
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                parts = [future.result() for future in pending.popleft()]
+                next_date = next(remaining_dates, None)
+                if next_date is not None:
+                    pending.append([pool.submit(simulate_worker_chunk, next_date, engine, chunk, seed, sampler) for chunk in chunks])
+
+                snapshot = parts[0][0]
+                trump_wins = np.concatenate([
+                    np.unpackbits(packed, axis=1, count=len(VOTES)).astype(bool) for _, packed, _, _, _ in parts
+                ])
+                trump_votes = np.concatenate([votes.astype(np.int64) for _, _, votes, _, _ in parts])
+                harris_votes = np.concatenate([votes.astype(np.int64) for _, _, _, votes, _ in parts])
+                analytics = merge_state_analytics([analytics for _, _, _, _, analytics in parts])
+                yield snapshot, (trump_wins, trump_votes, harris_votes), analytics
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
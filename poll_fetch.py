@@ -0,0 +1,126 @@
+# poll csv download: conditional requests (ETag / If-Modified-Since) so an
+# unchanged file costs a 304, the body streamed to disk and renamed into
+# place, a pooled session retrying with backoff, and every downloaded version
+# kept once under its sha256 so a run can be pinned to an exact file
+#
+#   data/president_polls_LATEST.csv            latest download
+#   data/president_polls_LATEST.csv.meta.json  url, etag, last_modified, sha256
+#   data/poll_snapshots/<sha256>.csv           every version downloaded
+
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POLLS_URL = "https://projects.fivethirtyeight.com/polls/data/president_polls.csv"
+LATEST_POLLS_FILE = "data/president_polls_LATEST.csv"
+SNAPSHOTS_DIR = "data/poll_snapshots"
+
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+TIMEOUT_SECONDS = 60
+RETRIES = 5
+# waits 0.5, 1, 2, 4... seconds between attempts
+BACKOFF_FACTOR = 0.5
+
+
+@lru_cache(maxsize=None)
+def poll_session(retries=RETRIES, backoff_factor=BACKOFF_FACTOR):
+    # one pooled session per process, retrying connection errors and the usual transient statuses
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET", "HEAD"))
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    return session
+
+
+def metadata_file(filename):
+    return f"{filename}.meta.json"
+
+
+def load_metadata(filename):
+    # validators of the last download, only trusted while the file itself is there
+    if not os.path.exists(filename) or not os.path.exists(metadata_file(filename)):
+        return {}
+    with open(metadata_file(filename)) as file:
+        return json.load(file)
+
+
+def write_atomically(path, write):
+    # write(file) fills a temporary file next to path, renamed over it once complete
+    temporary_name = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_name, 'wb') as file:
+            write(file)
+        os.replace(temporary_name, path)
+    finally:
+        if os.path.exists(temporary_name):
+            os.unlink(temporary_name)
+
+
+def snapshot_path(sha256, snapshots_dir=SNAPSHOTS_DIR):
+    return f"{snapshots_dir}/{sha256}.csv"
+
+
+def store_snapshot(filename, sha256, snapshots_dir=SNAPSHOTS_DIR):
+    # hard link when the filesystem allows it, the content never changes under a hash
+    path = snapshot_path(sha256, snapshots_dir)
+    if not os.path.exists(path):
+        os.makedirs(snapshots_dir, exist_ok=True)
+        try:
+            os.link(filename, path)
+        except OSError:
+            with open(filename, 'rb') as source:
+                write_atomically(path, lambda file: shutil.copyfileobj(source, file))
+    return path
+
+
+def fetch_polls(filename=LATEST_POLLS_FILE, url=POLLS_URL, snapshots_dir=SNAPSHOTS_DIR, session=None, timeout=TIMEOUT_SECONDS):
+    # brings filename up to date with url, returns its metadata with 'changed'
+    # telling whether anything was downloaded; raises requests.HTTPError on failure
+    session = session or poll_session()
+    metadata = load_metadata(filename)
+    headers = {}
+    if metadata.get('url') == url:
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            print(f"'{filename}' is up to date ({metadata['sha256'][:12]})")
+            return {**metadata, 'changed': False}
+        response.raise_for_status()
+
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        digest = hashlib.sha256()
+
+        def write_body(file):
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                digest.update(chunk)
+                file.write(chunk)
+        write_atomically(filename, write_body)
+
+        metadata = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': digest.hexdigest(),
+        }
+    metadata['snapshot'] = store_snapshot(filename, metadata['sha256'], snapshots_dir)
+    write_atomically(metadata_file(filename), lambda file: file.write(json.dumps(metadata, indent=2).encode()))
+    print(f"CSV file has been downloaded and saved as '{filename}' ({metadata['sha256'][:12]})")
+    return {**metadata, 'changed': True}
+
+
+def pinned_polls(sha256, snapshots_dir=SNAPSHOTS_DIR):
+    # path of an earlier download, for rerunning a day on exactly its polls
+    path = snapshot_path(sha256, snapshots_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no poll snapshot {sha256} in {snapshots_dir}")
+    return path
@@ -0,0 +1,43 @@
+# per-state, per-candidate poll lookups built once per as-of date,
+# so the simulation loop does dict lookups instead of filtering the 538 frame
+
+from electoral_numbers import ELECTORAL_NUMBERS
+
+# poll answers counted for each candidate (Biden polls carry over to Harris)
+CANDIDATE_ALIASES = {
+    "Trump": ["Trump"],
+    "Harris": ["Harris", "Biden"],
+}
+
+# number of latest polls averaged per state and candidate
+POLL_WINDOW = 5
+
+
+def build_poll_index(df, window=POLL_WINDOW):
+    # df is expected to hold only the polls visible at the as-of date
+    # and to have end_date parsed as datetime
+    states = [state_info['state'] for state_info in ELECTORAL_NUMBERS]
+    df = df[df['state'].isin(states)]
+
+    # sort once for the whole frame, newest first
+    df = df.sort_values('end_date', ascending=False, kind='stable')
+
+    poll_index = {}
+    for candidate, answers in CANDIDATE_ALIASES.items():
+        candidate_polls = df[df['answer'].isin(answers)]
+        for state, polls in candidate_polls.groupby('state', sort=False, observed=True):
+            poll_index[(state, candidate)] = {
+                'state': state,
+                'candidate': candidate,
+                'percentage': polls['pct'].head(window).mean(),
+                'poll_date': polls['end_date'].iloc[0].strftime("%m/%d/%y"),
+                'polls': polls,
+            }
+    return poll_index
+
+
+def lookup_poll(poll_index, state, candidate, verbose=True):
+    poll = poll_index.get((state, candidate))
+    if poll is None and verbose:
+        print(f"No polls found for {candidate} in {state}")
+    return poll
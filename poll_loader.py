@@ -0,0 +1,92 @@
+# typed poll loading: only the columns the model reads, with explicit dtypes,
+# cached as npz under the sha256 of the source csv so a run on an unchanged
+# download skips the csv parser and the date parsing entirely
+#
+#   data/poll_cache/<sha256>.npz   state/answer as category codes + categories,
+#                                  end_date as datetime64[ns], ids and pct as numbers
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from poll_fetch import write_atomically
+
+POLL_CACHE_DIR = "data/poll_cache"
+# bump when the columns or dtypes change, older caches are then ignored
+POLL_CACHE_VERSION = 1
+
+POLL_COLUMNS = ['poll_id', 'question_id', 'state', 'end_date', 'answer', 'pct']
+CATEGORY_COLUMNS = ['state', 'answer']
+# pct stays float64: the snapshot means and probabilities are computed from it
+# and float32 would move them in the 7th digit
+POLL_DTYPES = {
+    'poll_id': np.int64,
+    'question_id': np.int64,
+    'state': 'category',
+    'answer': 'category',
+    'pct': np.float64,
+}
+END_DATE_FORMAT = "%m/%d/%y"
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_sha256(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def poll_cache_file(sha256, cache_dir=POLL_CACHE_DIR):
+    return f"{cache_dir}/{sha256}.v{POLL_CACHE_VERSION}.npz"
+
+
+def read_polls_csv(filename):
+    df = pd.read_csv(filename, usecols=POLL_COLUMNS, dtype=POLL_DTYPES)
+    df['end_date'] = pd.to_datetime(df['end_date'], format=END_DATE_FORMAT)
+    return df[POLL_COLUMNS]
+
+
+def polls_arrays(df, columns=POLL_COLUMNS):
+    # npz-ready arrays of a typed poll frame
+    arrays = {}
+    for column in columns:
+        if column in CATEGORY_COLUMNS:
+            arrays[f"{column}_codes"] = df[column].cat.codes.to_numpy()
+            arrays[f"{column}_categories"] = df[column].cat.categories.to_numpy(dtype=str)
+        else:
+            arrays[column] = df[column].to_numpy()
+    return arrays
+
+
+def polls_frame(data, columns=POLL_COLUMNS):
+    # typed poll frame back from polls_arrays (or an npz holding them)
+    frame = {}
+    for column in columns:
+        if column in CATEGORY_COLUMNS:
+            frame[column] = pd.Categorical.from_codes(data[f"{column}_codes"], data[f"{column}_categories"])
+        else:
+            frame[column] = data[column]
+    return pd.DataFrame(frame, columns=columns)
+
+
+def save_polls_cache(df, file_name):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    write_atomically(file_name, lambda file: np.savez(file, **polls_arrays(df)))
+
+
+def load_polls_cache(file_name):
+    with np.load(file_name) as data:
+        return polls_frame(data)
+
+
+def load_polls(filename, cache_dir=POLL_CACHE_DIR):
+    # the polls of a 538 csv with end_date parsed, from the cache when the
+    # same file was loaded before
+    cache_file = poll_cache_file(file_sha256(filename), cache_dir)
+    if os.path.exists(cache_file):
+        return load_polls_cache(cache_file)
+    df = read_polls_csv(filename)
+    save_polls_cache(df, cache_file)
+    return df
@@ -0,0 +1,143 @@
+# append-only local store of the 538 polls: every fetch hashes the raw csv
+# records and parses only those it has not seen, a known (question_id, answer)
+# with a new hash being a revision, so ingestion costs the day's delta
+# rather than the file's whole history
+#
+#   data/poll_store/polls.npz   every version of every row ever ingested, in
+#                               ingestion order, with its record hash, the
+#                               csv header it was parsed under and the record
+#                               hashes of the last csv ingested
+#
+# the current polls are the rows of the csv just ingested, looked up by their
+# record hashes in its order, so they are exactly those of a full load: a
+# revision reverted upstream goes back to the earlier version (without parsing
+# it again) and rows dropped upstream are dropped
+
+import hashlib
+import io
+import os
+import numpy as np
+import pandas as pd
+from poll_fetch import write_atomically
+from poll_loader import POLL_COLUMNS, CATEGORY_COLUMNS, read_polls_csv, polls_arrays, polls_frame
+
+POLL_STORE_FILE = "data/poll_store/polls.npz"
+KEY_COLUMNS = ['question_id', 'answer']
+STORE_COLUMNS = POLL_COLUMNS + ['row_hash']
+
+
+def csv_records(data):
+    # raw records of a csv file, a quoted field may run over several lines
+    records = []
+    pending = []
+    quotes = 0
+    for line in data.splitlines():
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            records.append(b"\n".join(pending))
+            pending = []
+            quotes = 0
+    if pending:
+        records.append(b"\n".join(pending))
+    return [record for record in records if record.strip()]
+
+
+def record_hash(record):
+    return int.from_bytes(hashlib.blake2b(record, digest_size=8).digest(), 'little')
+
+
+def new_poll_store(header):
+    polls = read_polls_csv(io.BytesIO(header + b"\n"))
+    polls['row_hash'] = np.array([], dtype=np.uint64)
+    return {'header': header, 'polls': polls, 'current_hashes': np.array([], dtype=np.uint64)}
+
+
+def load_poll_store(file_name=POLL_STORE_FILE):
+    if not os.path.exists(file_name):
+        return None
+    with np.load(file_name) as data:
+        polls = polls_frame(data, STORE_COLUMNS)
+        # stores written before the current hashes were kept: the latest version of every key
+        current_hashes = (data['current_hashes'] if 'current_hashes' in data.files
+                          else polls.drop_duplicates(KEY_COLUMNS, keep='last')['row_hash'].to_numpy())
+        return {'header': data['header'].item().encode(), 'polls': polls, 'current_hashes': current_hashes}
+
+
+def save_poll_store(store, file_name=POLL_STORE_FILE):
+    arrays = polls_arrays(store['polls'], STORE_COLUMNS)
+    arrays['header'] = np.array(store['header'].decode())
+    arrays['current_hashes'] = store['current_hashes']
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    write_atomically(file_name, lambda file: np.savez(file, **arrays))
+
+
+def append_polls(polls, new_polls):
+    # concat keeping state and answer categorical over the union of their categories
+    polls = pd.concat([polls, new_polls], ignore_index=True)
+    for column in CATEGORY_COLUMNS:
+        polls[column] = polls[column].astype('category')
+    return polls
+
+
+def current_polls(polls, hashes):
+    # the stored rows of the csv whose record hashes are given, in its order
+    # (identical records hash the same, any of their rows will do); the
+    # categories are those of the rows kept, like read_polls_csv's
+    polls = polls[~polls['row_hash'].duplicated()]
+    polls = polls.iloc[pd.Index(polls['row_hash'].to_numpy()).get_indexer(hashes)].reset_index(drop=True)
+    for column in CATEGORY_COLUMNS:
+        polls[column] = polls[column].cat.remove_unused_categories()
+    return polls
+
+
+def poll_changes(before, after, parsed_hashes):
+    # rows of (question_id, answer) keys new, revised or removed between two
+    # sets of current polls; a revision to a version already in the store (a
+    # revision reverted upstream) is also counted as reverted
+    changes = before[KEY_COLUMNS + ['state', 'row_hash']].drop_duplicates(KEY_COLUMNS, keep='last').merge(
+        after[KEY_COLUMNS + ['state', 'row_hash']].drop_duplicates(KEY_COLUMNS, keep='last'),
+        on=KEY_COLUMNS, how='outer', suffixes=('_before', '_after'), indicator=True)
+    new = changes['_merge'] == 'right_only'
+    removed = changes['_merge'] == 'left_only'
+    revised = (changes['_merge'] == 'both') & (changes['row_hash_before'] != changes['row_hash_after'])
+    reverted = revised & ~changes['row_hash_after'].isin(parsed_hashes)
+    changed = changes[new | removed | revised]
+    # a revision can move a poll between states, both of them changed
+    states = set(changed['state_before'].dropna().astype(str)) | set(changed['state_after'].dropna().astype(str))
+    return {
+        'new_rows': int(new.sum()),
+        'revised_rows': int(revised.sum()),
+        'reverted_rows': int(reverted.sum()),
+        'removed_rows': int(removed.sum()),
+        'states': sorted(states),
+    }
+
+
+def ingest_polls(filename, store_file=POLL_STORE_FILE):
+    # brings the store up to date with a 538 csv, returns the current polls and
+    # the change set against the previous csv ingested: the number of new,
+    # revised (reverted among them) and removed rows and the states whose polls
+    # changed, the ones downstream stages have to recompute
+    with open(filename, 'rb') as file:
+        header, *records = csv_records(file.read())
+    hashes = np.fromiter((record_hash(record) for record in records), dtype=np.uint64, count=len(records))
+
+    store = load_poll_store(store_file)
+    if store is None or store['header'] != header:
+        # first ingestion, or the columns moved: the old hashes say nothing
+        store = new_poll_store(header)
+    before = current_polls(store['polls'], store['current_hashes'])
+
+    unseen = ~np.isin(hashes, store['polls']['row_hash'].to_numpy())
+    if unseen.any():
+        new_polls = read_polls_csv(io.BytesIO(b"\n".join([header] + [record for record, new in zip(records, unseen) if new])))
+        new_polls['row_hash'] = hashes[unseen]
+        store['polls'] = append_polls(store['polls'], new_polls)
+    after = current_polls(store['polls'], hashes)
+    changes = poll_changes(before, after, hashes[unseen])
+
+    if unseen.any() or not np.array_equal(store['current_hashes'], hashes):
+        store['current_hashes'] = hashes
+        save_poll_store(store, store_file)
+    return after[POLL_COLUMNS], changes
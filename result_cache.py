@@ -0,0 +1,141 @@
+# content-addressed cache of the historical pipeline's per-date outputs: a
+# date's key hashes everything its results depend on (the polls visible as of
+# the date, the model parameters, N, the seed, the engine and its options),
+# and a rerun whose key is in the index, with its files untouched since, skips
+# the date instead of simulating and rewriting it
+#
+#   data/historical/result_cache.json   key -> date, output files (size, mtime), last use
+#                                       plus the hit/miss/eviction counters
+#
+# the outputs themselves stay where the pipeline writes them; past the size
+# budget the least recently used dates' outputs are deleted
+#
+#   python result_cache.py   prints the statistics
+
+import hashlib
+import json
+import os
+import time
+from asof_polls import as_days
+from poll_fetch import write_atomically
+
+RESULT_CACHE_FILE = "data/historical/result_cache.json"
+RESULT_CACHE_BUDGET_MB = 4096
+# bump when a change to the engines or the outputs makes the cached ones stale
+RESULT_CACHE_VERSION = 2
+
+
+def load_result_cache(file_name=RESULT_CACHE_FILE):
+    if not os.path.exists(file_name):
+        return {'entries': {}, 'stats': {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}}
+    with open(file_name) as file:
+        return json.load(file)
+
+
+def save_result_cache(cache, file_name=RESULT_CACHE_FILE):
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    write_atomically(file_name, lambda file: file.write(json.dumps(cache, indent=2).encode()))
+
+
+def date_cache_key(asof, date_object, parameters):
+    # sha256 of the parameters and of the polls visible as of the date, read
+    # from the as-of store (asof_polls) in its order, which fixes the windows
+    visible = asof['days'] <= as_days([date_object])[0]
+    digest = hashlib.sha256()
+    digest.update(json.dumps({**parameters, 'date': date_object.isoformat(), 'version': RESULT_CACHE_VERSION},
+                             sort_keys=True, default=str).encode())
+    digest.update(asof['keys'][visible].tobytes())
+    digest.update(asof['pct'][visible].tobytes())
+    return digest.hexdigest()
+
+
+def output_files(paths):
+    # files behind the given paths, a results folder counts with its files
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(f"{root}/{name}" for root, _, names in os.walk(path) for name in names)
+        elif os.path.exists(path):
+            files.append(path)
+    return files
+
+
+def file_signature(path):
+    status = os.stat(path)
+    return [status.st_size, status.st_mtime_ns]
+
+
+def is_cached(cache, key):
+    # a hit needs every output of the entry still there as it was written
+    entry = cache['entries'].get(key)
+    hit = entry is not None and not entry['stale'] and all(
+        os.path.exists(path) and file_signature(path) == signature for path, signature in entry['files'].items())
+    if hit:
+        entry['last_used'] = time.time()
+        cache['stats']['hits'] += 1
+    else:
+        cache['stats']['misses'] += 1
+    return hit
+
+
+def record_outputs(cache, key, date_part, paths):
+    files = {path: file_signature(path) for path in output_files(paths)}
+    # an entry sharing files with the new one (the date's snapshot written by a
+    # run with another N or seed) lost them to it: it can no longer be a hit,
+    # its other files are kept track of until evicted
+    for other_key, entry in list(cache['entries'].items()):
+        if other_key == key or files.keys().isdisjoint(entry['files']):
+            continue
+        entry['files'] = {path: signature for path, signature in entry['files'].items() if path not in files}
+        entry['bytes'] = sum(size for size, _ in entry['files'].values())
+        entry['stale'] = True
+        if not entry['files']:
+            del cache['entries'][other_key]
+    cache['entries'][key] = {
+        'date': date_part,
+        'files': files,
+        'bytes': sum(size for size, _ in files.values()),
+        'last_used': time.time(),
+        'stale': False,
+    }
+
+
+def remove_outputs(entry):
+    for path in entry['files']:
+        if os.path.exists(path):
+            os.unlink(path)
+        directory = os.path.dirname(path)
+        # a results folder goes with its last file
+        if os.path.basename(directory).startswith("election_results_") and not os.listdir(directory):
+            os.rmdir(directory)
+
+
+def evict_outputs(cache, budget_bytes, keep=()):
+    # stale entries, then the least recently used dates, until the outputs fit
+    # the budget; the keys in keep (the current run's) are never evicted
+    total = sum(entry['bytes'] for entry in cache['entries'].values())
+    by_last_use = sorted(cache['entries'].items(), key=lambda item: (not item[1]['stale'], item[1]['last_used']))
+    for key, entry in by_last_use:
+        if total <= budget_bytes:
+            break
+        if key in keep:
+            continue
+        remove_outputs(entry)
+        del cache['entries'][key]
+        total -= entry['bytes']
+        cache['stats']['evictions'] += 1
+        cache['stats']['evicted_bytes'] += entry['bytes']
+    return total
+
+
+def cache_report(cache):
+    stats = cache['stats']
+    lookups = stats['hits'] + stats['misses']
+    total = sum(entry['bytes'] for entry in cache['entries'].values())
+    return (f"result cache: {len(cache['entries'])} dates, {total / 2**20:.1f} MB, "
+            f"{stats['hits']} hits / {stats['misses']} misses ({stats['hits'] / max(lookups, 1):.0%}), "
+            f"{stats['evictions']} evictions ({stats['evicted_bytes'] / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    print(cache_report(load_result_cache()))
@@ -0,0 +1,89 @@
+# compact columnar results of a date's simulations, replacing the list of
+# result dicts pickles: one folder per date with the model snapshot stored
+# once and memory-mappable .npy columns per simulation
+#
+#   data/historical/election_results_<date>_<N>/
+#       model_snapshot.csv   state pcts, votes, poll dates and probabilities
+#       masks.npy            uint64 winners bitmask (see outcome_masks)
+#       trump_votes.npy      int16 electoral votes per simulation
+#       harris_votes.npy     int16
+#
+# existing pickles are converted with
+#   python results_store.py data/historical/election_results_*.pickle
+
+import os
+import pickle
+import sys
+import numpy as np
+import pandas as pd
+from electoral_numbers import ELECTORAL_NUMBERS
+from election_probability import election_probability
+from model_snapshot import SNAPSHOT_COLUMNS, MARGIN_OF_ERROR, UNDECIDED, snapshot_row, save_model_snapshot, load_model_snapshot
+from outcome_masks import results_to_masks, results_state_details
+
+RESULT_COLUMNS = ['masks', 'trump_votes', 'harris_votes']
+
+
+def results_path(date_part, number_of_simulations, directory="data/historical"):
+    return f"{directory}/election_results_{date_part}_{number_of_simulations}"
+
+
+def save_results(path, snapshot, masks, trump_votes, harris_votes):
+    os.makedirs(path, exist_ok=True)
+    save_model_snapshot(snapshot, f"{path}/model_snapshot.csv")
+    np.save(f"{path}/masks.npy", np.asarray(masks, dtype=np.uint64))
+    np.save(f"{path}/trump_votes.npy", np.asarray(trump_votes, dtype=np.int16))
+    np.save(f"{path}/harris_votes.npy", np.asarray(harris_votes, dtype=np.int16))
+
+
+def load_results(path):
+    # the per-simulation columns are memory maps, nothing is read until used
+    results = {'snapshot': load_model_snapshot(f"{path}/model_snapshot.csv")}
+    for column in RESULT_COLUMNS:
+        results[column] = np.load(f"{path}/{column}.npy", mmap_mode='r')
+    return results
+
+
+def is_results_path(path):
+    return os.path.isdir(path) and os.path.exists(f"{path}/masks.npy")
+
+
+def snapshot_from_results(results_list, moe=MARGIN_OF_ERROR, uv=UNDECIDED):
+    # the pickles only kept pcts/votes/dates, the probabilities are recomputed
+    state_details = results_state_details(results_list)
+    rows = []
+    for state_info in ELECTORAL_NUMBERS:
+        details = state_details.get(state_info['state'])
+        if details is None:
+            rows.append(snapshot_row(state_info, None, None, moe, uv))
+            continue
+        rows.append({
+            'state': state_info['state'],
+            'state_abbr': state_info['state_abbr'],
+            'votes': details['votes'],
+            'trump_pct': details['Trump'],
+            'harris_pct': details['Harris'],
+            'poll_date': details['date'],
+            'trump_win_prob': election_probability(details['Trump'], details['Harris'], moe, uv),
+        })
+    return pd.DataFrame(rows, columns=SNAPSHOT_COLUMNS)
+
+
+def convert_pickle(pickle_path):
+    # election_results_<date>_<N>.pickle -> election_results_<date>_<N>/
+    with open(pickle_path, 'rb') as file:
+        results_list = pickle.load(file)
+    path = pickle_path[:-len(".pickle")]
+    save_results(
+        path,
+        snapshot_from_results(results_list),
+        results_to_masks(results_list),
+        [result['trump_votes'] for result in results_list],
+        [result['harris_votes'] for result in results_list],
+    )
+    return path
+
+
+if __name__ == "__main__":
+    for pickle_path in sys.argv[1:]:
+        print(f"{pickle_path} -> {convert_pickle(pickle_path)}")
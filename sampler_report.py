@@ -0,0 +1,71 @@
+# variance reduction of the samplers on one date: the date's run is
+# replicated with every sampler and the spread of the headline numbers
+# compared with plain i.i.d. draws
+#
+#   python sampler_report.py --date 2024-11-04 --sims 10000 --replications 30
+
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from batch_engine import chunk_rng, simulate_batch
+from correlated_engine import simulate_correlated_batch
+from exact_engine import TOTAL_VOTES, ev_distribution
+from model_snapshot import snapshot_probabilities, load_model_snapshot
+from samplers import SAMPLERS
+
+
+def variance_reduction_report(snapshot, date_object, number_of_simulations, seed, replications=30,
+                              engine="numpy", samplers=SAMPLERS):
+    # replicates the date's run with every sampler and compares the spread of
+    # P(Trump win), of the mean Trump EV and of the EV pmf against i.i.d. draws;
+    # "speedup" is the i.i.d. variance over the sampler's, i.e. how many times
+    # more i.i.d. simulations give the same precision
+    trump_probs = snapshot_probabilities(snapshot)
+    exact_pmf = ev_distribution(trump_probs) if engine == "numpy" else None
+    rows = []
+    for sampler in samplers:
+        win_probabilities = []
+        mean_votes = []
+        pmf_errors = []
+        for replication in range(replications):
+            rng = chunk_rng(seed, date_object, replication)
+            if engine == "numpy":
+                _, trump_votes, harris_votes = simulate_batch(trump_probs, number_of_simulations, rng, sampler=sampler)
+            else:
+                _, trump_votes, harris_votes = simulate_correlated_batch(snapshot, number_of_simulations, rng, sampler=sampler)
+            win_probabilities.append(np.mean(trump_votes > harris_votes))
+            mean_votes.append(np.mean(trump_votes))
+            if exact_pmf is not None:
+                pmf = np.bincount(trump_votes, minlength=TOTAL_VOTES + 1) / number_of_simulations
+                pmf_errors.append(np.sum((pmf - exact_pmf) ** 2))
+        rows.append({
+            'sampler': sampler,
+            'trump_win': np.mean(win_probabilities),
+            'trump_win_variance': np.var(win_probabilities, ddof=1),
+            'mean_trump_votes': np.mean(mean_votes),
+            'mean_trump_votes_variance': np.var(mean_votes, ddof=1),
+            'ev_pmf_squared_error': np.mean(pmf_errors) if pmf_errors else np.nan,
+        })
+    report = pd.DataFrame(rows)
+    iid = report[report['sampler'] == "iid"]
+    if len(iid):
+        for column in ('trump_win', 'mean_trump_votes'):
+            report[f'{column}_speedup'] = iid[f'{column}_variance'].iloc[0] / report[f'{column}_variance']
+        report['ev_pmf_speedup'] = iid['ev_pmf_squared_error'].iloc[0] / report['ev_pmf_squared_error']
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Variance reduction of each sampler on one date's snapshot")
+    parser.add_argument("--date", required=True, help="YYYY-MM-DD, reads data/historical/model_snapshot_<date>.csv")
+    parser.add_argument("--sims", type=int, default=10_000)
+    parser.add_argument("--replications", type=int, default=30)
+    parser.add_argument("--engine", choices=["numpy", "correlated"], default="numpy")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    date_object = datetime.strptime(args.date, "%Y-%m-%d").date()
+    snapshot = load_model_snapshot(f"data/historical/model_snapshot_{date_object.strftime('%Y_%m_%d')}.csv")
+    report = variance_reduction_report(snapshot, date_object, args.sims, args.seed, args.replications, args.engine)
+    print(report.to_string(index=False))
@@ -0,0 +1,54 @@
+# variance-reduction samplers for the batch engines: the (simulations x states)
+# draws can be plain i.i.d., antithetic pairs, stratified per state (Latin
+# hypercube) or a scrambled Sobol sequence (see sampler_report.py for what
+# each one gains on a given date)
+
+import warnings
+import numpy as np
+
+SAMPLERS = ("iid", "antithetic", "stratified", "sobol")
+
+
+def scipy_modules():
+    # scipy is only needed by the sobol sampler and by normal draws from
+    # stratified/sobol uniforms, everything else runs without it
+    try:
+        from scipy import special, stats
+    except ImportError as error:
+        raise ImportError("the sobol sampler and stratified correlated draws need scipy (pip install scipy)") from error
+    return special, stats
+
+
+def uniform_draws(sampler, number_of_simulations, dimensions, rng):
+    # (simulations x dimensions) uniforms on [0, 1), every column marginally uniform
+    if sampler == "iid":
+        return rng.random((number_of_simulations, dimensions))
+    if sampler == "antithetic":
+        # u and 1 - u in the two halves: a state won in one half tends to be lost in the other
+        half = rng.random(((number_of_simulations + 1) // 2, dimensions))
+        return np.concatenate([half, 1.0 - half])[:number_of_simulations]
+    if sampler == "stratified":
+        # one draw in each of the n equal strata of every state, strata shuffled independently per state
+        strata = np.argsort(rng.random((number_of_simulations, dimensions)), axis=0)
+        return (strata + rng.random((number_of_simulations, dimensions))) / number_of_simulations
+    if sampler == "sobol":
+        _, stats = scipy_modules()
+        engine = stats.qmc.Sobol(dimensions, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # the balance warning for sizes that are not powers of 2 is expected here
+            warnings.simplefilter("ignore", UserWarning)
+            return engine.random(number_of_simulations)
+    raise ValueError(f"unknown sampler {sampler}, expected one of {SAMPLERS}")
+
+
+def normal_draws(sampler, number_of_simulations, dimensions, rng):
+    # standard normals for the correlated engine; iid keeps rng.standard_normal's stream
+    if sampler == "iid":
+        return rng.standard_normal((number_of_simulations, dimensions))
+    if sampler == "antithetic":
+        half = rng.standard_normal(((number_of_simulations + 1) // 2, dimensions))
+        return np.concatenate([half, -half])[:number_of_simulations]
+    special, _ = scipy_modules()
+    uniforms = uniform_draws(sampler, number_of_simulations, dimensions, rng)
+    # keeps ndtri away from the infinities at exactly 0
+    return special.ndtri(np.clip(uniforms, 1e-16, 1 - 1e-16))
@@ -0,0 +1,71 @@
+# "what moves the needle" for a date: how P(Trump wins the election) reacts
+# to each state's poll margin and to each state being flipped outright, from
+# the exact EV distribution and the closed-form election_probability gradient
+#
+#   python sensitivity.py --date 2024-11-04
+
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from election_probability import election_probability_gradient
+from exact_engine import exact_outcome, leave_one_out_win_probabilities
+from model_snapshot import MARGIN_OF_ERROR, UNDECIDED, snapshot_probabilities, load_model_snapshot
+
+SENSITIVITY_COLUMNS = ['state', 'state_abbr', 'votes', 'trump_win_prob', 'margin_sensitivity',
+                       'state_win_sensitivity', 'state_margin_sensitivity',
+                       'flip_to_trump_effect', 'flip_to_harris_effect']
+
+
+def sensitivity_file(date_part, directory="data/historical"):
+    return f"{directory}/sensitivity_{date_part}.csv"
+
+
+def sensitivity_report(snapshot, moe=MARGIN_OF_ERROR, uv=UNDECIDED):
+    # per state, as fractions of P(Trump wins the election):
+    #   margin_sensitivity        change per point of Trump's poll margin in the state
+    #                             (half a point to Trump, half a point from Harris)
+    #   state_win_sensitivity     change per unit of the state's win probability
+    #   state_margin_sensitivity  change of the state's win probability per margin point
+    #   flip_to_*_effect          change when the state is given to that candidate outright
+    trump_probs = snapshot_probabilities(snapshot)
+    baseline = exact_outcome(trump_probs)['trump_win']
+    leave_one_out = leave_one_out_win_probabilities(trump_probs)
+
+    state_margin_sensitivity = []
+    for trump_pct, harris_pct in zip(snapshot['trump_pct'], snapshot['harris_pct']):
+        if np.isnan(trump_pct) or np.isnan(harris_pct):
+            state_margin_sensitivity.append(np.nan)
+            continue
+        d_trump, d_harris = election_probability_gradient(trump_pct, harris_pct, moe, uv)
+        state_margin_sensitivity.append((d_trump - d_harris) / 2 / 100)
+    state_margin_sensitivity = np.array(state_margin_sensitivity)
+
+    state_win_sensitivity = (leave_one_out['trump_win_if_trump'] - leave_one_out['trump_win_if_harris']).to_numpy()
+    report = pd.DataFrame({
+        'state': snapshot['state'],
+        'state_abbr': snapshot['state_abbr'],
+        'votes': snapshot['votes'],
+        'trump_win_prob': snapshot['trump_win_prob'],
+        'margin_sensitivity': state_win_sensitivity * state_margin_sensitivity,
+        'state_win_sensitivity': state_win_sensitivity,
+        'state_margin_sensitivity': state_margin_sensitivity,
+        'flip_to_trump_effect': leave_one_out['trump_win_if_trump'].to_numpy() - baseline,
+        'flip_to_harris_effect': leave_one_out['trump_win_if_harris'].to_numpy() - baseline,
+    }, columns=SENSITIVITY_COLUMNS)
+    return report.sort_values('margin_sensitivity', ascending=False, na_position='last').reset_index(drop=True)
+
+
+def save_sensitivity_report(report, file_name):
+    report.to_csv(file_name, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sensitivity of P(Trump wins) to each state on one date")
+    parser.add_argument("--date", required=True, help="YYYY-MM-DD, reads data/historical/model_snapshot_<date>.csv")
+    args = parser.parse_args()
+
+    date_part = datetime.strptime(args.date, "%Y-%m-%d").strftime('%Y_%m_%d')
+    report = sensitivity_report(load_model_snapshot(f"data/historical/model_snapshot_{date_part}.csv"))
+    save_sensitivity_report(report, sensitivity_file(date_part))
+    print(report.head(15).to_string(index=False))
@@ -0,0 +1,227 @@
+# large runs split into (date, chunk range) shards claimed from a sqlite
+# queue by any number of workers, possibly on several machines sharing the
+# data folder; each shard writes a mergeable partial and the merge gives
+# exactly the counts of a single-process run with the same seed, written as
+# the date's summary (date_summary.py) that gen_visuals reads
+#
+# the snapshots the shards simulate are kept under SHARDS_DIR by their
+# sha256, recorded with the run: the pipeline rewriting (or the result cache
+# evicting) data/historical/model_snapshot_<date>.csv does not affect a queued run
+#
+#   python sharded_runs.py enqueue --sims 10000000 --seed 2024
+#   python sharded_runs.py work        (as many as wanted, anywhere)
+#   python sharded_runs.py merge
+
+import argparse
+import hashlib
+import os
+import socket
+import sqlite3
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from batch_engine import CHUNK_SIZE, simulation_chunks, count_winners
+from model_snapshot import sweep_model_snapshots, load_model_snapshot, snapshot_details
+from parallel_runner import BATCH_ENGINES, simulate_snapshot_chunks
+from outcome_masks import encode_outcomes, combination_frequencies
+from poll_loader import load_polls, file_sha256
+from poll_fetch import write_atomically
+from date_summary import summary_file, ev_difference_histogram, date_summary, save_date_summary
+
+SHARDS_DIR = "data/historical/shards"
+QUEUE_FILE = f"{SHARDS_DIR}/queue.sqlite"
+
+# a running shard whose worker has not finished within the lease is handed out again
+LEASE_SECONDS = 3600
+
+
+def connect_queue(queue_file=QUEUE_FILE):
+    os.makedirs(os.path.dirname(queue_file) or ".", exist_ok=True)
+    connection = sqlite3.connect(queue_file, timeout=60, isolation_level=None)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            date TEXT PRIMARY KEY,
+            sims INTEGER, seed INTEGER, engine TEXT, chunk_size INTEGER, snapshot_sha256 TEXT
+        )""")
+    # queues created before the snapshots were pinned by hash
+    if 'snapshot_sha256' not in [column[1] for column in connection.execute("PRAGMA table_info(runs)")]:
+        connection.execute("ALTER TABLE runs ADD COLUMN snapshot_sha256 TEXT")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS shards (
+            id INTEGER PRIMARY KEY,
+            date TEXT, first_chunk INTEGER, last_chunk INTEGER,
+            status TEXT DEFAULT 'pending', worker TEXT, lease_until REAL
+        )""")
+    return connection
+
+
+def snapshot_file(date_part, sha256):
+    return f"{SHARDS_DIR}/model_snapshot_{date_part}_{sha256}.csv"
+
+
+def store_snapshot(snapshot, date_part):
+    # content-addressed: a later enqueue of the date writes a new file instead of
+    # changing the one earlier shards simulate
+    csv_bytes = snapshot.to_csv(index=False).encode()
+    sha256 = hashlib.sha256(csv_bytes).hexdigest()
+    if not os.path.exists(snapshot_file(date_part, sha256)):
+        write_atomically(snapshot_file(date_part, sha256), lambda file: file.write(csv_bytes))
+    return sha256
+
+
+def pinned_snapshot(date_part, sha256):
+    if sha256 is None:
+        raise ValueError(f"{date_part} was queued without a pinned snapshot, enqueue it again")
+    file_name = snapshot_file(date_part, sha256)
+    if not os.path.exists(file_name) or file_sha256(file_name) != sha256:
+        raise ValueError(f"{file_name} is missing or changed since {date_part} was queued")
+    return load_model_snapshot(file_name)
+
+
+def partial_file(date_part, first_chunk, last_chunk):
+    return f"{SHARDS_DIR}/partial_{date_part}_{first_chunk}_{last_chunk}.npz"
+
+
+def enqueue_run(df, date_objects, number_of_simulations, seed, engine, chunks_per_shard, queue_file=QUEUE_FILE):
+    # stores each date's snapshot for the workers and queues its shards
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    connection = connect_queue(queue_file)
+    number_of_chunks = len(simulation_chunks(number_of_simulations))
+    for date_object, snapshot in sweep_model_snapshots(df, date_objects):
+        date_part = date_object.strftime('%Y_%m_%d')
+        snapshot_sha256 = store_snapshot(snapshot, date_part)
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM shards WHERE date = ?", (date_part,))
+        connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                           (date_part, number_of_simulations, seed, engine, CHUNK_SIZE, snapshot_sha256))
+        connection.executemany(
+            "INSERT INTO shards (date, first_chunk, last_chunk) VALUES (?, ?, ?)",
+            [(date_part, first, min(first + chunks_per_shard, number_of_chunks))
+             for first in range(0, number_of_chunks, chunks_per_shard)])
+        connection.execute("COMMIT")
+    connection.close()
+
+
+def claim_shard(connection, worker):
+    connection.execute("BEGIN IMMEDIATE")
+    shard = connection.execute("""
+        SELECT id, date, first_chunk, last_chunk FROM shards
+        WHERE status = 'pending' OR (status = 'running' AND lease_until < ?)
+        ORDER BY id LIMIT 1""", (time.time(),)).fetchone()
+    if shard is not None:
+        connection.execute("UPDATE shards SET status = 'running', worker = ?, lease_until = ? WHERE id = ?",
+                           (worker, time.time() + LEASE_SECONDS, shard[0]))
+    connection.execute("COMMIT")
+    return shard
+
+
+def shard_partial(trump_wins, trump_votes, harris_votes):
+    trump_counter, harris_counter, tie_counter = count_winners(trump_votes, harris_votes)
+    combinations, frequencies = np.unique(encode_outcomes(trump_wins), return_counts=True)
+    return {
+        'counts': np.array([trump_counter, harris_counter, tie_counter], dtype=np.int64),
+        'ev_difference_histogram': ev_difference_histogram(trump_votes, harris_votes),
+        'combinations': combinations,
+        'frequencies': frequencies.astype(np.int64),
+    }
+
+
+def save_partial(partial, file_name):
+    # a crash never leaves a half partial behind
+    write_atomically(file_name, lambda file: np.savez(file, **partial))
+
+
+def run_worker(queue_file=QUEUE_FILE):
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    connection = connect_queue(queue_file)
+    snapshots = {}
+    while True:
+        shard = claim_shard(connection, worker)
+        if shard is None:
+            break
+        shard_id, date_part, first_chunk, last_chunk = shard
+        number_of_simulations, seed, engine, chunk_size, snapshot_sha256 = connection.execute(
+            "SELECT sims, seed, engine, chunk_size, snapshot_sha256 FROM runs WHERE date = ?", (date_part,)).fetchone()
+        if snapshot_sha256 not in snapshots:
+            snapshots[snapshot_sha256] = pinned_snapshot(date_part, snapshot_sha256)
+
+        date_object = datetime.strptime(date_part, '%Y_%m_%d').date()
+        chunks = simulation_chunks(number_of_simulations, chunk_size)[first_chunk:last_chunk]
+        print(f"{worker} simulating {date_part} chunks {first_chunk}-{last_chunk}")
+        batch = simulate_snapshot_chunks(snapshots[snapshot_sha256], date_object, engine, chunks, seed)
+        save_partial(shard_partial(*batch), partial_file(date_part, first_chunk, last_chunk))
+
+        connection.execute("UPDATE shards SET status = 'done' WHERE id = ? AND worker = ?", (shard_id, worker))
+    connection.close()
+
+
+def merge_partials(partials):
+    combinations = np.concatenate([partial['combinations'] for partial in partials])
+    frequencies = np.concatenate([partial['frequencies'] for partial in partials])
+    unique_combinations, inverse = np.unique(combinations, return_inverse=True)
+    merged_frequencies = np.zeros(len(unique_combinations), dtype=np.int64)
+    np.add.at(merged_frequencies, inverse, frequencies)
+    return {
+        'counts': sum(partial['counts'] for partial in partials),
+        'ev_difference_histogram': sum(partial['ev_difference_histogram'] for partial in partials),
+        'combinations': unique_combinations,
+        'frequencies': merged_frequencies,
+    }
+
+
+def merge_run(queue_file=QUEUE_FILE):
+    # merges every date whose shards are all done into its summary_<date>_<N>.json
+    connection = connect_queue(queue_file)
+    runs = connection.execute("SELECT date, sims, snapshot_sha256 FROM runs ORDER BY date").fetchall()
+    for date_part, number_of_simulations, snapshot_sha256 in runs:
+        shards = connection.execute(
+            "SELECT first_chunk, last_chunk, status FROM shards WHERE date = ? ORDER BY first_chunk",
+            (date_part,)).fetchall()
+        if any(status != 'done' for _, _, status in shards):
+            print(f"{date_part}: {sum(status != 'done' for _, _, status in shards)} shards not done yet")
+            continue
+        partials = []
+        for first_chunk, last_chunk, _ in shards:
+            with np.load(partial_file(date_part, first_chunk, last_chunk)) as partial:
+                partials.append({key: partial[key] for key in partial.files})
+        merged = merge_partials(partials)
+        snapshot = pinned_snapshot(date_part, snapshot_sha256)
+        covered_votes = sum(details['votes'] for details in snapshot_details(snapshot).values())
+        combination_counts = combination_frequencies(merged['combinations'], merged['frequencies'], covered_votes)
+        file_name = summary_file(date_part, number_of_simulations)
+        save_date_summary(date_summary(snapshot, datetime.strptime(date_part, '%Y_%m_%d').date(), number_of_simulations,
+                                       merged['counts'], merged['ev_difference_histogram'], combination_counts), file_name)
+        trump_counter, harris_counter, tie_counter = merged['counts']
+        print(f"{date_part} TOTAL: Trump: {trump_counter} Harris: {harris_counter} Tie: {tie_counter} -> {file_name}")
+    connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded simulation runs over a sqlite job queue")
+    parser.add_argument("--queue", default=QUEUE_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="store the dates' snapshots and queue their shards")
+    enqueue.add_argument("--polls", default="data/president_polls_LATEST.csv")
+    enqueue.add_argument("--start", default="2024-09-01")
+    enqueue.add_argument("--end", default="2024-11-04")
+    enqueue.add_argument("--sims", type=int, default=10_000_000)
+    enqueue.add_argument("--seed", type=int, required=True)
+    enqueue.add_argument("--engine", choices=BATCH_ENGINES, default="numpy")
+    enqueue.add_argument("--chunks-per-shard", type=int, default=10,
+                         help=f"shard size in chunks of {CHUNK_SIZE} simulations")
+
+    commands.add_parser("work", help="simulate queued shards until none is left")
+    commands.add_parser("merge", help="merge the partials of every completed date")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        df = load_polls(args.polls)
+        start_date = datetime.strptime(args.start, "%Y-%m-%d").date()
+        end_date = datetime.strptime(args.end, "%Y-%m-%d").date()
+        date_objects = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        enqueue_run(df, date_objects, args.sims, args.seed, args.engine, args.chunks_per_shard, args.queue)
+    elif args.command == "work":
+        run_worker(args.queue)
+    else:
+        merge_run(args.queue)
@@ -0,0 +1,35 @@
+# per-date state importance table from the counters the batch engines fill
+# while simulating (batch_engine.update_state_analytics):
+#   trump_win_frequency      share of simulations Trump wins the state
+#   tipping_point_frequency  share of simulations the state is the tipping point
+#   decisive_probability     share of simulations flipping the state alone changes the winner
+#   power_share              decisive probability normalised over the states (Banzhaf index)
+
+import pandas as pd
+from electoral_numbers import ELECTORAL_NUMBERS
+
+ANALYTICS_COLUMNS = ['state', 'state_abbr', 'votes', 'trump_win_frequency', 'tipping_point_frequency',
+                     'decisive_probability', 'power_share']
+
+
+def state_analytics_file(date_part, directory="data/historical"):
+    return f"{directory}/state_analytics_{date_part}.csv"
+
+
+def state_analytics_table(analytics):
+    simulations = max(analytics['simulations'], 1)
+    decisive_probability = analytics['decisive'] / simulations
+    total_decisive = decisive_probability.sum()
+    return pd.DataFrame({
+        'state': [state_info['state'] for state_info in ELECTORAL_NUMBERS],
+        'state_abbr': [state_info['state_abbr'] for state_info in ELECTORAL_NUMBERS],
+        'votes': [state_info['votes'] for state_info in ELECTORAL_NUMBERS],
+        'trump_win_frequency': analytics['trump_wins'] / simulations,
+        'tipping_point_frequency': analytics['tipping_points'] / simulations,
+        'decisive_probability': decisive_probability,
+        'power_share': decisive_probability / total_decisive if total_decisive > 0 else 0.0,
+    }, columns=ANALYTICS_COLUMNS)
+
+
+def save_state_analytics(analytics, file_name):
+    state_analytics_table(analytics).to_csv(file_name, index=False)
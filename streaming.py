@@ -0,0 +1,179 @@
+# streaming aggregation of a date's simulations: chunks are simulated and
+# folded into fixed-size counters and sketches, so peak memory is set by a
+# budget instead of growing with the number of simulations
+
+import numpy as np
+import pandas as pd
+from batch_engine import VOTES, CHUNK_SIZE, ANALYTICS_ROWS, simulation_chunks, chunk_rng, simulate_batch, count_winners, electoral_votes, new_state_analytics
+from correlated_engine import simulate_correlated_batch
+from exact_engine import TOTAL_VOTES
+from model_snapshot import snapshot_probabilities
+from outcome_masks import encode_outcomes, decode_outcomes, COMBINATION_COLUMNS
+
+MEMORY_BUDGET_MB = 256
+
+# rough bytes per simulation in flight: two float64 matrices (the draws and the
+# correlated engine's product of them, reused as the analytics margins), the
+# winners and their int16 copy for the votes, masks, votes
+BYTES_PER_SIMULATION = 2 * 8 * len(VOTES) + 3 * len(VOTES) + 8 + 16
+# the state analytics temporaries of ANALYTICS_ROWS simulations, taken off the budget
+ANALYTICS_BYTES = ANALYTICS_ROWS * 64 * len(VOTES)
+# rough bytes per sketch entry, including the temporaries of a merge
+BYTES_PER_SKETCH_ENTRY = 64
+
+
+def map_log_probabilities(masks, trump_probs):
+    # log probability of each map under the independent-state model; the log of
+    # each state's outcome is picked rather than multiplied in, so a certain
+    # state (p of 0 or 1) adds 0 instead of 0 * -inf = nan
+    covered = ~np.isnan(trump_probs)
+    with np.errstate(divide='ignore'):
+        log_trump = np.where(covered, np.log(np.nan_to_num(trump_probs)), 0.0)
+        log_harris = np.where(covered, np.log1p(-np.nan_to_num(trump_probs)), 0.0)
+    trump_wins = decode_outcomes(masks)
+    return np.where(trump_wins, log_trump, log_harris).sum(axis=1)
+
+
+def new_aggregate(snapshot, sketch_capacity, least_likely_size=20):
+    # online counters for one date; the most frequent maps are kept in a
+    # Misra-Gries sketch (frequencies are lower bounds, off by at most
+    # max_error) and the least likely winning maps of each candidate in
+    # bounded sets ranked by their model probability
+    trump_probs = snapshot_probabilities(snapshot)
+    empty_set = lambda: {'masks': np.empty(0, dtype=np.uint64), 'counts': np.empty(0, dtype=np.int64), 'log_probabilities': np.empty(0)}
+    return {
+        'trump_probs': trump_probs,
+        'covered_votes': int(VOTES[~np.isnan(trump_probs)].sum()),
+        'sketch_capacity': sketch_capacity,
+        'least_likely_size': least_likely_size,
+        'number_of_simulations': 0,
+        'counts': np.zeros(3, dtype=np.int64),
+        # index = Trump minus Harris votes + TOTAL_VOTES
+        'ev_difference_histogram': np.zeros(2 * TOTAL_VOTES + 1, dtype=np.int64),
+        # per-state wins, tipping points and decisive counts, filled by the engines
+        'analytics': new_state_analytics(),
+        'sketch_masks': np.empty(0, dtype=np.uint64),
+        'sketch_counts': np.empty(0, dtype=np.int64),
+        'max_error': 0,
+        'least_likely': {'Trump': empty_set(), 'Harris': empty_set()},
+    }
+
+
+def merge_counts(masks_a, counts_a, masks_b, counts_b):
+    masks, inverse = np.unique(np.concatenate([masks_a, masks_b]), return_inverse=True)
+    counts = np.zeros(len(masks), dtype=np.int64)
+    np.add.at(counts, inverse, np.concatenate([counts_a, counts_b]))
+    return masks, counts
+
+
+def update_sketch(aggregate, masks, counts):
+    masks, counts = merge_counts(aggregate['sketch_masks'], aggregate['sketch_counts'], masks, counts)
+    capacity = aggregate['sketch_capacity']
+    if len(masks) > capacity:
+        # Misra-Gries merge: the (capacity + 1)-th largest count is taken off every entry
+        cutoff = np.partition(counts, len(counts) - capacity - 1)[len(counts) - capacity - 1]
+        counts -= cutoff
+        aggregate['max_error'] += int(cutoff)
+        masks, counts = masks[counts > 0], counts[counts > 0]
+    aggregate['sketch_masks'], aggregate['sketch_counts'] = masks, counts
+
+
+def update_least_likely(aggregate, candidate, masks, counts):
+    # a map's probability never changes, so a map still kept has been kept
+    # since its first appearance and its count is exact
+    kept = aggregate['least_likely'][candidate]
+    masks, counts = merge_counts(kept['masks'], kept['counts'], masks, counts)
+    log_probabilities = map_log_probabilities(masks, aggregate['trump_probs'])
+    order = np.argsort(log_probabilities, kind='stable')[:aggregate['least_likely_size']]
+    aggregate['least_likely'][candidate] = {
+        'masks': masks[order], 'counts': counts[order], 'log_probabilities': log_probabilities[order],
+    }
+
+
+def update_aggregate(aggregate, trump_wins, trump_votes, harris_votes):
+    aggregate['number_of_simulations'] += len(trump_votes)
+    aggregate['counts'] += np.array(count_winners(trump_votes, harris_votes), dtype=np.int64)
+    difference = np.asarray(trump_votes, dtype=np.int64) - np.asarray(harris_votes, dtype=np.int64)
+    aggregate['ev_difference_histogram'] += np.bincount(difference + TOTAL_VOTES, minlength=2 * TOTAL_VOTES + 1)
+
+    masks, counts = np.unique(encode_outcomes(trump_wins), return_counts=True)
+    update_sketch(aggregate, masks, counts)
+    trump_votes = electoral_votes(decode_outcomes(masks))
+    harris_votes = aggregate['covered_votes'] - trump_votes
+    update_least_likely(aggregate, 'Trump', masks[trump_votes > harris_votes], counts[trump_votes > harris_votes])
+    update_least_likely(aggregate, 'Harris', masks[trump_votes < harris_votes], counts[trump_votes < harris_votes])
+
+
+def aggregate_combination_counts(aggregate):
+    # sketch contents shaped like outcome_masks.count_combination_masks
+    order = np.lexsort((aggregate['sketch_masks'], -aggregate['sketch_counts']))
+    masks = aggregate['sketch_masks'][order]
+    trump_votes = decode_outcomes(masks) @ VOTES
+    return pd.DataFrame({
+        'mask': masks.astype(np.int64),
+        'frequency': aggregate['sketch_counts'][order],
+        'trump_votes': trump_votes,
+        'harris_votes': aggregate['covered_votes'] - trump_votes,
+    }, columns=COMBINATION_COLUMNS)
+
+
+def aggregate_least_likely(aggregate, candidate):
+    # the candidate's least likely simulated wins first, with their frequency and model probability
+    kept = aggregate['least_likely'][candidate]
+    trump_votes = decode_outcomes(kept['masks']) @ VOTES
+    return pd.DataFrame({
+        'mask': kept['masks'].astype(np.int64),
+        'frequency': kept['counts'],
+        'trump_votes': trump_votes,
+        'harris_votes': aggregate['covered_votes'] - trump_votes,
+        'probability': np.exp(kept['log_probabilities']),
+    }, columns=COMBINATION_COLUMNS + ['probability'])
+
+
+def save_aggregate(aggregate, file_name):
+    least_likely = aggregate['least_likely']
+    np.savez(
+        file_name,
+        number_of_simulations=np.int64(aggregate['number_of_simulations']),
+        counts=aggregate['counts'],
+        ev_difference_histogram=aggregate['ev_difference_histogram'],
+        state_trump_wins=aggregate['analytics']['trump_wins'],
+        tipping_points=aggregate['analytics']['tipping_points'],
+        decisive=aggregate['analytics']['decisive'],
+        combinations=aggregate['sketch_masks'],
+        frequencies=aggregate['sketch_counts'],
+        max_error=np.int64(aggregate['max_error']),
+        **{f"least_likely_{candidate.lower()}_{key}": least_likely[candidate][key]
+           for candidate in least_likely for key in ('masks', 'counts')},
+        # set by adaptive_stopping runs
+        **{key: np.asarray(aggregate[key]) for key in ('stopped_by', 'interval') if key in aggregate},
+    )
+
+
+def budget_sizes(memory_budget_mb):
+    # three quarters of the budget for the simulations in flight, the rest for the sketch
+    budget = max(memory_budget_mb * 1024 * 1024 - ANALYTICS_BYTES, 0)
+    piece_size = max(1000, int(budget * 0.75 / BYTES_PER_SIMULATION))
+    sketch_capacity = max(1000, int(budget * 0.25 / BYTES_PER_SKETCH_ENTRY))
+    return piece_size, sketch_capacity
+
+
+def simulate_streaming(snapshot, date_object, engine, number_of_simulations, seed, memory_budget_mb=MEMORY_BUDGET_MB, sampler="iid"):
+    # same draws as parallel_runner.simulate_snapshot_chunks: every seeded chunk
+    # is generated in pieces that fit the budget from the chunk's own stream
+    # (for the non-iid samplers the pieces are the units of stratification)
+    piece_size, sketch_capacity = budget_sizes(memory_budget_mb)
+    piece_size = min(piece_size, CHUNK_SIZE)
+    aggregate = new_aggregate(snapshot, sketch_capacity)
+    trump_probs = snapshot_probabilities(snapshot)
+    for chunk_index, start, stop in simulation_chunks(number_of_simulations):
+        rng = chunk_rng(seed, date_object, chunk_index)
+        for piece_start in range(start, stop, piece_size):
+            piece = min(piece_size, stop - piece_start)
+            if engine == "numpy":
+                update_aggregate(aggregate, *simulate_batch(trump_probs, piece, rng, sampler=sampler, analytics=aggregate['analytics']))
+            elif engine == "correlated":
+                update_aggregate(aggregate, *simulate_correlated_batch(snapshot, piece, rng, sampler=sampler, analytics=aggregate['analytics']))
+            else:
+                raise ValueError(f"streaming needs a batch engine, got {engine}")
+    return aggregate
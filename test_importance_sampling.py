@@ -0,0 +1,53 @@
+# upset maps of the importance sampler against the exact engine
+#
+#   python -m pytest test_importance_sampling.py
+
+import numpy as np
+import pandas as pd
+from batch_engine import STATES, VOTES
+from exact_engine import most_probable_maps
+from importance_sampling import simulate_candidate_wins, winning_maps, least_likely_win
+
+SWING_STATES = ["Pennsylvania", "Georgia", "North Carolina", "Michigan", "Arizona", "Wisconsin", "Nevada"]
+
+
+def snapshot_with_swing_states():
+    # every other state certain (DC at 0 and the Trump states at 1 included),
+    # Vermont without polls, Trump favoured in the swing states
+    trump_probs = np.empty(len(STATES))
+    trump_votes = 0
+    for i, state in enumerate(STATES):
+        if state in SWING_STATES:
+            trump_probs[i] = 0.8
+        elif state == "Vermont":
+            trump_probs[i] = np.nan
+        elif state != "District of Columbia" and trump_votes < 219:
+            trump_probs[i] = 1.0
+            trump_votes += VOTES[i]
+        else:
+            trump_probs[i] = 0.0
+    return pd.DataFrame({'state': STATES, 'trump_win_prob': trump_probs * 100})
+
+
+def exact_map_probabilities(snapshot):
+    # every map of the swing states, by mask
+    maps = most_probable_maps(snapshot['trump_win_prob'].to_numpy() / 100, 2 ** len(SWING_STATES))
+    return maps.set_index('mask')
+
+
+def test_winning_map_probabilities_are_exact():
+    snapshot = snapshot_with_swing_states()
+    maps = winning_maps(simulate_candidate_wins(snapshot, "Harris", 2000, np.random.default_rng(0)))
+    exact = exact_map_probabilities(snapshot)
+    assert not maps.empty and np.isfinite(maps['probability']).all()
+    assert np.allclose(maps['probability'], exact.loc[maps['mask'], 'probability'], rtol=1e-9, atol=0)
+
+
+def test_least_likely_win_is_the_least_probable_winning_map():
+    snapshot = snapshot_with_swing_states()
+    exact = exact_map_probabilities(snapshot)
+    harris_wins = exact[exact['harris_votes'] > exact['trump_votes']]
+    least_likely = least_likely_win(snapshot, "Harris", 2000, np.random.default_rng(0))
+    assert np.isfinite(least_likely['probability'])
+    assert least_likely['mask'] == harris_wins['probability'].idxmin()
+    assert np.isclose(least_likely['probability'], harris_wins['probability'].min(), rtol=1e-9, atol=0)
@@ -0,0 +1,116 @@
+# poll_fetch against a local http.server stand-in for the polls url
+#
+#   python -m pytest test_poll_fetch.py
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from poll_fetch import fetch_polls, poll_session, metadata_file
+
+POLLS_V1 = b"poll_id,state,pct\n1,Ohio,48.5\n"
+POLLS_V2 = b"poll_id,state,pct\n1,Ohio,48.5\n2,Iowa,51.0\n"
+LAST_MODIFIED = "Mon, 04 Nov 2024 12:00:00 GMT"
+
+
+class PollsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.path != "/polls.csv":
+            self.send_error(404)
+            return
+        if server.failures:
+            self.send_error(server.failures.pop(0))
+            return
+        etag = f'"{len(server.body)}-{server.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        # a truncated body: the connection closes before the announced length
+        self.send_header("Content-Length", str(len(server.body) + (100 if server.truncate else 0)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def polls_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PollsHandler)
+    server.body, server.version, server.failures, server.truncate, server.requests = POLLS_V1, 1, [], False, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/polls.csv"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {'filename': str(tmp_path / "polls.csv"), 'snapshots_dir': str(tmp_path / "snapshots")}
+
+
+def fetch(server, paths, url=None):
+    # retries without backoff, the test does not wait
+    return fetch_polls(url=url or server.url, session=poll_session(backoff_factor=0), timeout=5, **paths)
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_unchanged_file_is_a_304(polls_server, paths):
+    first = fetch(polls_server, paths)
+    second = fetch(polls_server, paths)
+    assert first['changed'] and not second['changed']
+    assert second['sha256'] == first['sha256']
+    assert polls_server.requests[1]['If-None-Match'] == first['etag']
+    assert polls_server.requests[1]['If-Modified-Since'] == LAST_MODIFIED
+    assert read(paths['filename']) == POLLS_V1
+
+
+def test_retries_after_503(polls_server, paths):
+    polls_server.failures = [503, 503]
+    metadata = fetch(polls_server, paths)
+    assert metadata['changed']
+    assert len(polls_server.requests) == 3
+    assert read(paths['filename']) == POLLS_V1
+
+
+def test_failed_download_leaves_no_partial_file(polls_server, paths):
+    fetch(polls_server, paths)
+    polls_server.body, polls_server.version, polls_server.truncate = POLLS_V2, 2, True
+    with pytest.raises(requests.RequestException):
+        fetch(polls_server, paths)
+    # the previous download and its metadata are untouched, no temporary file is left
+    assert read(paths['filename']) == POLLS_V1
+    assert sorted(os.listdir(os.path.dirname(paths['filename']))) == sorted(
+        [os.path.basename(paths['filename']), os.path.basename(metadata_file(paths['filename'])), "snapshots"])
+
+
+def test_snapshots_are_deduplicated_by_sha256(polls_server, paths):
+    first = fetch(polls_server, paths)
+    polls_server.body, polls_server.version = POLLS_V2, 2
+    second = fetch(polls_server, paths)
+    # the same content again under a new etag
+    polls_server.body, polls_server.version = POLLS_V1, 3
+    third = fetch(polls_server, paths)
+    assert third['changed'] and third['sha256'] == first['sha256'] != second['sha256']
+    assert third['snapshot'] == first['snapshot']
+    assert sorted(os.listdir(paths['snapshots_dir'])) == sorted(f"{metadata['sha256']}.csv" for metadata in (first, second))
+    assert read(first['snapshot']) == POLLS_V1 and read(second['snapshot']) == POLLS_V2
+
+
+def test_404_raises_http_error(polls_server, paths):
+    with pytest.raises(requests.HTTPError):
+        fetch(polls_server, paths, url=polls_server.url.replace("polls.csv", "missing.csv"))
+    assert not os.path.exists(paths['filename'])
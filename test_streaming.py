@@ -0,0 +1,31 @@
+# map probabilities of the streaming aggregate
+#
+#   python -m pytest test_streaming.py
+
+import warnings
+import numpy as np
+from batch_engine import STATES, simulate_batch
+from outcome_masks import encode_outcomes
+from streaming import map_log_probabilities
+
+# a state certain for each candidate, an uncovered one, the rest toss-ups
+TRUMP_PROBS = np.full(len(STATES), 0.5)
+TRUMP_PROBS[STATES.index("District of Columbia")] = 0.0
+TRUMP_PROBS[STATES.index("Wyoming")] = 1.0
+TRUMP_PROBS[STATES.index("Vermont")] = np.nan
+
+
+def test_certain_states_add_nothing():
+    trump_wins, _, _ = simulate_batch(TRUMP_PROBS, 1000, np.random.default_rng(0))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        log_probabilities = map_log_probabilities(encode_outcomes(trump_wins), TRUMP_PROBS)
+    # every drawn map is one of the 2^48 equally likely toss-up maps
+    assert np.allclose(log_probabilities, 48 * np.log(0.5))
+
+
+def test_impossible_map_has_probability_zero():
+    trump_wins = np.zeros((1, len(STATES)), dtype=bool)
+    trump_wins[0, STATES.index("District of Columbia")] = True
+    log_probabilities = map_log_probabilities(encode_outcomes(trump_wins), TRUMP_PROBS)
+    assert np.exp(log_probabilities[0]) == 0